@@ -0,0 +1,126 @@
+# Benchmark of the artwork tagging stage on a directory of MP3s (200 by default).
+#  - before: the old per-track loop, a bare requests.get() per track then ID3 loaded and saved
+#    up to three times
+#  - after: TaggingStage, concurrent downloads over a pooled session with identical artwork URLs
+#    fetched once, and a single ID3 load/save per file
+# Artwork comes from a local HTTP server with a per-request latency to stand in for the CDN.
+# Every variant tags a fresh copy of the same directory. Reports wall time, artwork requests
+# served and checks both variants embedded the same covers.
+#
+# Usage:
+#   python bench_tagging.py [--files 200] [--size-mb 4] [--distinct-artwork 40] [--latency 0.08] [--workers 8]
+
+import argparse
+import collections
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from mutagen.id3 import ID3, ID3NoHeaderError, APIC
+
+import soundcloud_playlist_download as downloader
+
+ARTWORK_BYTES = 120 * 1024  # About the size of a 500x500 SoundCloud cover
+
+
+def legacy_tag(track_path, image_url):
+    # The pre-tagging-stage code, kept here for comparison
+    image_data = requests.get(image_url).content
+    try:
+        audio = ID3(track_path)
+    except ID3NoHeaderError:
+        audio = ID3()
+        audio.save(track_path)
+    audio = ID3(track_path)
+    audio['APIC'] = APIC(encoding=3, mime='image/jpeg', type=3, desc=u'Cover', data=image_data)
+    audio.save()
+
+
+def serve_artwork(distinct, latency):
+    requests_served = collections.Counter()
+    images = [os.urandom(ARTWORK_BYTES) for _ in range(distinct)]
+
+    class ArtworkHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled connections get reused
+
+        def do_GET(self):
+            requests_served[self.path] += 1
+            time.sleep(latency)
+            data = images[int(self.path.rsplit('/', 1)[-1].split('.')[0])]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArtworkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests_served
+
+
+def make_tracks(directory, files, size_mb, distinct, base_url):
+    # MP3 payloads don't matter to ID3 tagging, random bytes of a realistic size will do
+    payload = os.urandom(size_mb * 1024 * 1024)
+    tracks = []
+    for i in range(files):
+        track_path = os.path.join(directory, f"Track {i:03d}.mp3")
+        with open(track_path, 'wb') as f:
+            f.write(payload)
+        tracks.append((track_path, f"{base_url}/art/{i % distinct}.jpg", f"Track {i:03d}"))
+    return tracks
+
+
+def covers(tracks):
+    return [ID3(track_path)['APIC:Cover'].data for track_path, _, _ in tracks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the artwork tagging stage')
+    parser.add_argument('--files', type=int, default=200, help='MP3 files in the test directory')
+    parser.add_argument('--size-mb', type=int, default=4, help='Size of every MP3 file')
+    parser.add_argument('--distinct-artwork', type=int, default=40, help='Different covers shared by the tracks')
+    parser.add_argument('--latency', type=float, default=0.08, help='Seconds the artwork server waits per request')
+    parser.add_argument('--workers', type=int, default=downloader.ARTWORK_WORKERS, help='Tagging stage workers')
+    args = parser.parse_args()
+
+    server, requests_served = serve_artwork(args.distinct_artwork, args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory() as scratch:
+        source = os.path.join(scratch, 'source')
+        os.makedirs(source)
+        source_tracks = make_tracks(source, args.files, args.size_mb, args.distinct_artwork, base_url)
+        print(f"{args.files} files of {args.size_mb} MB, {args.distinct_artwork} distinct covers, "
+              f"{args.latency * 1000:.0f} ms per artwork request")
+
+        results = {}
+        for variant in ('before', 'after'):
+            directory = shutil.copytree(source, os.path.join(scratch, variant))
+            tracks = [(os.path.join(directory, os.path.basename(path)), url, title)
+                      for path, url, title in source_tracks]
+            requests_served.clear()
+            start = time.perf_counter()
+            if variant == 'before':
+                for track_path, image_url, _ in tracks:
+                    legacy_tag(track_path, image_url)
+            else:
+                tagging = downloader.TaggingStage(workers=args.workers)
+                with contextlib.redirect_stdout(io.StringIO()):  # Silence the per-track lines
+                    for track in tracks:
+                        tagging.submit(*track)
+                    tagging.finish()
+            elapsed = time.perf_counter() - start
+            results[variant] = covers(tracks)
+            print(f"{variant:<7} {elapsed:7.2f}s  {args.files / elapsed:7.1f} files/s  "
+                  f"{sum(requests_served.values()):4d} artwork requests")
+        print(f"same covers embedded: {results['before'] == results['after']}")
+    server.shutdown()
@@ -11,12 +11,24 @@ brew install ffmpeg
 import os
 import json
 import sys
+import time
+import hashlib
 import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import yt_dlp
 import requests
+from requests.adapters import HTTPAdapter
 from mutagen.id3 import ID3, ID3NoHeaderError, APIC
 from mutagen.mp3 import MP3
 
+PROGRESS_INTERVAL = 2  # Seconds between aggregated progress lines when downloading with --jobs
+MANIFEST_FILE = '.soundcloud_manifest.json'  # Kept in the download directory, see load_download_manifest()
+ARTWORK_WORKERS = 8  # Artwork downloads and tag writes running at once in the tagging stage
+ARTWORK_TIMEOUT = (10, 30)  # Connect and read timeouts of artwork downloads, in seconds
+
+print_lock = threading.Lock()  # Keeps lines printed from worker threads apart
+
 def normalize_title(title):
     """Normalize track title for comparison by removing all non-alphanumeric characters"""
     import re
@@ -30,7 +42,309 @@ def debug_print(message, debug_mode=False):
     if debug_mode:
         print(message)
 
-def download_soundcloud_playlist(playlist_url, download_directory='downloads', debug_mode=False):
+def extract_playlist(ydl, playlist_url):
+    """Extract the playlist itself without resolving its tracks
+
+    Returns the unprocessed info dict with its entries as a list, so the same dict can give
+    the expected-track list and then be handed to ydl.process_ie_result() for the download,
+    which resolves each track once, right before downloading it.
+    """
+    info = ydl.extract_info(playlist_url, download=False, process=False)
+    if info and 'entries' in info:
+        info['entries'] = list(info['entries'] or [])
+    return info
+
+def track_manifest(info):
+    """Expected tracks (title, url, id) of a playlist info dict, or of a single track's
+
+    Flat SoundCloud set entries only carry the track id and permalink, so until a track has
+    been resolved its title is the last part of the permalink.
+    """
+    entries = info.get('entries') if 'entries' in info else [info]
+    tracks = []
+    for entry in entries:
+        if entry:
+            url = entry.get('webpage_url') or entry.get('url') or 'Unknown URL'
+            tracks.append({
+                'title': entry.get('title') or url.rstrip('/').rsplit('/', 1)[-1].split('?')[0],
+                'url': url,
+                'id': entry.get('id', 'Unknown ID')
+            })
+    return tracks
+
+def update_manifest_titles(tracks, result):
+    """Replace manifest titles with the real ones from the tracks resolved during the download"""
+    titles = {entry.get('id'): entry.get('title') for entry in (result or {}).get('entries') or [] if entry}
+    for track in tracks:
+        track['title'] = titles.get(track['id']) or track['title']
+
+class PlaylistProgress:
+    """Aggregated console progress of tracks downloading and converting in parallel"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.downloading = {}  # File name -> bytes downloaded so far, for transfers in progress
+        self.downloaded_bytes = 0  # Bytes of finished transfers
+        self.converting = set()  # Files being converted, yt-dlp can call the hooks twice per event
+        self.started = time.monotonic()
+        self.last_print = 0.0
+        self.lock = threading.Lock()
+
+    def progress_hook(self, d):
+        with self.lock:
+            if d['status'] == 'downloading':
+                self.downloading[d['filename']] = d.get('downloaded_bytes') or 0
+            else:
+                self.downloading.pop(d['filename'], None)
+                if d['status'] == 'finished':
+                    self.downloaded_bytes += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+            now = time.monotonic()
+            if now - self.last_print >= PROGRESS_INTERVAL:
+                self.last_print = now
+                with print_lock:
+                    print(f"⏬ {self.done}/{self.total} tracks done, {self.status()}")
+
+    def postprocessor_hook(self, d):
+        if d['postprocessor'] != 'ExtractAudio':
+            return
+        with self.lock:
+            if d['status'] == 'started':
+                self.converting.add(d['info_dict'].get('filepath'))
+            elif d['status'] == 'finished':
+                self.converting.discard(d['info_dict'].get('filepath'))
+
+    def track_done(self, title, succeeded):
+        with self.lock:
+            self.done += 1
+            if not succeeded:
+                self.failed += 1
+            with print_lock:
+                print(f"{'✅' if succeeded else '❌'} [{self.done}/{self.total}] {title} ({self.status()})")
+
+    def status(self):
+        downloaded = self.downloaded_bytes + sum(self.downloading.values())
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (f"{len(self.downloading)} downloading, {len(self.converting)} converting, "
+                f"{downloaded / 1024 ** 2:.1f} MB at {downloaded / 1024 ** 2 / elapsed:.1f} MB/s")
+
+def download_tracks_parallel(entries, ydl_opts, jobs, debug_mode=False):
+    """Download playlist entries on a pool of `jobs` worker threads
+
+    YoutubeDL isn't thread-safe, so every worker builds its own and reuses it for each track it
+    picks up. Downloading is network bound and FFmpeg runs as a subprocess, so threads are
+    enough for one track's download to overlap another's conversion. Returns the resolved info
+    dict of every entry, None for the ones that failed.
+    """
+    progress = PlaylistProgress(len(entries))
+    worker_opts = {
+        **ydl_opts,
+        'quiet': not debug_mode,  # Per-track output from several workers would interleave
+        'noprogress': True,
+        'progress_hooks': [*ydl_opts.get('progress_hooks', []), progress.progress_hook],
+        'postprocessor_hooks': [*ydl_opts.get('postprocessor_hooks', []), progress.postprocessor_hook],
+    }
+    local = threading.local()
+    workers = []
+
+    def download_entry(entry):
+        if not hasattr(local, 'ydl'):
+            local.ydl = yt_dlp.YoutubeDL(worker_opts)
+            workers.append(local.ydl)
+        result = local.ydl.process_ie_result(dict(entry), download=True)
+        converted = any(download.get('filepath', '').endswith('.mp3')
+                        for download in (result or {}).get('requested_downloads', []))
+        progress.track_done((result or entry).get('title') or entry.get('url'), converted)
+        return result
+
+    print(f"⬇️  Downloading {len(entries)} tracks with {jobs} parallel workers...")
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(download_entry, entries))
+    finally:
+        for ydl in workers:
+            ydl.close()
+
+def load_download_manifest(download_directory):
+    """Tracks already in the download directory: track id -> path, size, artwork hash and tag state
+
+    Written after every run, so an --incremental run can tell which tracks it still has.
+    """
+    manifest_path = os.path.join(download_directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)['tracks']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+def save_download_manifest(download_directory, playlist_url, tracks):
+    """Atomically replace the download directory's manifest"""
+    manifest_path = os.path.join(download_directory, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({'playlist': playlist_url, 'tracks': tracks}, f, indent=2, ensure_ascii=False)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def track_on_disk(record, download_directory):
+    """Whether a manifest track's file is still there as it was left (same size)"""
+    track_path = os.path.join(download_directory, record['path'])
+    return os.path.isfile(track_path) and os.path.getsize(track_path) == record['size']
+
+class ArtworkCache:
+    """Artwork downloads over one pooled session, every distinct URL is fetched only once
+
+    Tracks of the same release usually share their cover, concurrent requests for a URL that
+    is already being fetched wait for that download instead of starting another.
+    """
+
+    def __init__(self, workers=ARTWORK_WORKERS):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.images = {}  # URL -> Future of the image bytes
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            image = self.images.get(url)
+            fetch = image is None
+            if fetch:
+                image = self.images[url] = Future()
+        if fetch:
+            try:
+                response = self.session.get(url, timeout=ARTWORK_TIMEOUT)
+                response.raise_for_status()
+                image.set_result(response.content)
+            except Exception as e:
+                image.set_exception(e)
+        return image.result()
+
+    def close(self):
+        self.session.close()
+
+def write_artwork(track_path, image_data):
+    """Embed the image as the front cover, loading and saving the file's ID3 tag once"""
+    try:
+        audio = ID3(track_path)
+    except ID3NoHeaderError:
+        audio = ID3()  # No tag yet, save() below creates it
+    audio['APIC'] = APIC(
+        encoding=3,  # 3 is for utf-8
+        mime='image/jpeg',  # Image mime type
+        type=3,  # 3 is for album front cover
+        desc=u'Cover',
+        data=image_data
+    )
+    audio.save(track_path)
+
+class TaggingStage:
+    """Embeds artwork on a pool of workers, tracks can be queued while downloads go on
+
+    Artwork comes through one ArtworkCache, so every distinct URL is fetched once.
+    """
+
+    def __init__(self, debug_mode=False, workers=ARTWORK_WORKERS):
+        self.artwork = ArtworkCache(workers)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.hashes = {}  # Track path -> Future of the SHA-256 of its embedded artwork
+        self.debug_mode = debug_mode
+
+    def submit(self, track_path, image_url, track_title):
+        self.hashes[track_path] = self.pool.submit(self.tag_track, track_path, image_url, track_title)
+
+    def tag_track(self, track_path, image_url, track_title):
+        debug_print(f"🔍 DEBUG - Image URL for {track_title}: {image_url}", self.debug_mode)
+        try:
+            image_data = self.artwork.get(image_url)
+            write_artwork(track_path, image_data)
+        except Exception as e:
+            with print_lock:
+                print(f"❌ Failed to embed artwork for {track_title}: {e}")
+                debug_print(f"🔍 DEBUG - Error details: {type(e).__name__}: {str(e)}", self.debug_mode)
+            return None
+        with print_lock:
+            print(f"✅ Artwork embedded for: {track_title}")
+        return hashlib.sha256(image_data).hexdigest()
+
+    def finish(self):
+        """Wait for the queued tracks, returns track path -> artwork SHA-256 (None where it failed)"""
+        try:
+            self.pool.shutdown(wait=True)
+        finally:
+            self.artwork.close()
+        debug_print(f"🔍 DEBUG - Artwork downloads: {len(self.artwork.images)} for {len(self.hashes)} tracks",
+                    self.debug_mode)
+        return {track_path: hashed.result() for track_path, hashed in self.hashes.items()}
+
+class TrackPostProcessing:
+    """Records and tags each track from yt-dlp's hooks, the moment its MP3 is in place
+
+    yt-dlp's last step for a track, MoveFiles, reports the final MP3 with the track's info, so
+    the track goes to the tagging stage while the next one downloads. The progress hook notes
+    every file the downloads write, which is what the cleanup removes besides the MP3s.
+    """
+
+    def __init__(self, manifest, tagging, debug_mode=False):
+        self.manifest = manifest
+        self.tagging = tagging
+        self.debug_mode = debug_mode
+        self.finished = {}  # Track path -> id, of the tracks downloaded by this run
+        self.titles = []
+        self.written_files = set()
+        self.lock = threading.Lock()
+
+    def progress_hook(self, d):
+        with self.lock:
+            self.written_files.add(d['filename'])
+            if d.get('tmpfilename'):
+                self.written_files.add(d['tmpfilename'])
+
+    def postprocessor_hook(self, d):
+        if d['postprocessor'] != 'MoveFiles' or d['status'] != 'finished':
+            return
+        track_info = d['info_dict']
+        track_path = track_info['filepath']
+        track_title, extension = os.path.splitext(os.path.basename(track_path))
+        if extension != '.mp3':
+            with print_lock:
+                print(f"❌ Conversion to MP3 failed for: {track_title}")
+            return  # Not finished, clean_up() removes the download
+        with print_lock:
+            print(f"🎵 Processing: {track_title}")
+        with self.lock:
+            self.finished[track_path] = str(track_info['id'])
+            self.titles.append(track_title)
+            self.manifest[str(track_info['id'])] = {
+                'title': track_info.get('title', track_title),
+                'url': track_info.get('webpage_url', ''),
+                'path': os.path.basename(track_path),
+                'size': None,  # Set once tagged
+                'thumbnail': track_info.get('thumbnail'),
+                'artwork_sha256': None,
+                'tag_state': 'no artwork',
+            }
+        if track_info.get('thumbnail'):
+            self.tagging.submit(track_path, track_info['thumbnail'], track_title)
+
+    def clean_up(self):
+        """Remove what the downloads left besides the finished MP3s (partial and unconverted files)"""
+        for file_path in self.written_files - set(self.finished):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                debug_print(f"🔍 DEBUG - Removed temporary file: {file_path}", self.debug_mode)
+
+def get_playlist_manifest(playlist_url):
+    """Fast path: the track manifest from a flat extraction, no track is resolved or downloaded"""
+    with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': 'in_playlist', 'ignoreerrors': True}) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    return track_manifest(info) if info else []
+
+def download_soundcloud_playlist(playlist_url, download_directory='downloads', debug_mode=False, jobs=1,
+                                 incremental=False):
     print(f"🔍 Starting download of playlist: {playlist_url}")
     print(f"📁 Download directory: {download_directory}")
     
@@ -41,6 +355,11 @@ def download_soundcloud_playlist(playlist_url, download_directory='downloads', d
         print(f"   download_directory: {download_directory}")
         print(f"   Current working directory: {os.getcwd()}")
     
+    # Each track is recorded and tagged from yt-dlp's hooks as soon as its MP3 is in place
+    manifest = load_download_manifest(download_directory)
+    tagging = TaggingStage(debug_mode)
+    finished_tracks = TrackPostProcessing(manifest, tagging, debug_mode)
+    
     # Set up yt-dlp options
     ydl_opts = {
         'format': 'bestaudio/best',
@@ -53,7 +372,6 @@ def download_soundcloud_playlist(playlist_url, download_directory='downloads', d
         'noplaylist': False,  # Set to False to download playlists
         'ignoreerrors': True,  # Skip errors
         'quiet': False,  # Only be quiet if not in debug mode
-        'writeinfojson': True, # Write metadata to JSON
         'keepvideo': False,    # Don't keep video files
         'concurrent_fragment_downloads': 4,  # Download fragments in parallel
         'fragment_retries': 2,  # Retry failed fragments
@@ -61,6 +379,8 @@ def download_soundcloud_playlist(playlist_url, download_directory='downloads', d
         'socket_timeout': 30,  # Timeout for network operations
         'http_chunk_size': 10485760,  # 10MB chunks for faster downloads
         'no_check_certificate': True, # Skip SSL verification
+        'progress_hooks': [finished_tracks.progress_hook],
+        'postprocessor_hooks': [finished_tracks.postprocessor_hook],
     }
     
     # DEBUG: Print ydl_opts configuration
@@ -74,139 +394,80 @@ def download_soundcloud_playlist(playlist_url, download_directory='downloads', d
         os.makedirs(download_directory)
         print(f"✅ Created download directory: {download_directory}")
 
-    # Download the playlist directly (no need to extract info twice)
-    print("⬇️  Starting download process...")
-    
-    # Extract playlist info to get expected tracks
+    # Extract the playlist once: the expected tracks and the download both come from this info
+    # dict, so each track is resolved a single time (right before it downloads)
     print("📋 Extracting playlist information...")
     expected_tracks = []
     download_errors = {}  # Track download errors
-    try:
-        with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': False}) as ydl:
-            info = ydl.extract_info(playlist_url, download=False)
-            if 'entries' in info:
-                for entry in info['entries']:
-                    if entry:
-                        expected_tracks.append({
-                            'title': entry.get('title', 'Unknown Title'),
-                            'url': entry.get('webpage_url', 'Unknown URL'),
-                            'id': entry.get('id', 'Unknown ID')
-                        })
-                print(f"📊 Expected tracks in playlist: {len(expected_tracks)}")
-    except Exception as e:
-        print(f"⚠️  Could not extract playlist info: {e}")
-        expected_tracks = []
-    
+    retagged_tracks = {}  # Track path -> id, of kept tracks whose artwork gets another try
+    skipped_tracks = []  # Tracks an incremental run already had
+    removed_tracks = []  # Manifest tracks that are no longer in the playlist
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([playlist_url])
+        try:
+            info = extract_playlist(ydl, playlist_url)
+            if info:
+                expected_tracks = track_manifest(info)
+                print(f"📊 Expected tracks in playlist: {len(expected_tracks)}")
+        except Exception as e:
+            print(f"⚠️  Could not extract playlist info: {e}")
+            info = None
 
-    # Wait for FFmpeg conversion to complete
-    print("⏳ Waiting for FFmpeg conversion to complete...")
-    import time
-    time.sleep(2)  # Give FFmpeg time to finish converting files
+        if info and 'entries' in info:
+            playlist_ids = {track['id'] for track in expected_tracks}
+            removed_tracks = [{'id': track_id, **record} for track_id, record in manifest.items()
+                              if track_id not in playlist_ids]
+            # The flat playlist has no modification times, so a track counts as changed when its
+            # file is gone or isn't the size we left it at
+            if incremental:
+                skipped_ids = {track['id'] for track in expected_tracks
+                               if track['id'] in manifest and track_on_disk(manifest[track['id']], download_directory)}
+                skipped_tracks = [{'id': track_id, **manifest[track_id]} for track_id in skipped_ids]
+                info['entries'] = [entry for entry in info['entries'] if entry and entry.get('id') not in skipped_ids]
+                update_manifest_titles(expected_tracks, {'entries': skipped_tracks})
+                print(f"⏭️  Up to date: {len(skipped_ids)}, new or changed: {len(info['entries'])}")
+                
+                # Kept tracks whose artwork couldn't be embedded get another try
+                for track in skipped_tracks:
+                    if track['tag_state'] == 'failed':
+                        track_path = os.path.join(download_directory, track['path'])
+                        retagged_tracks[track_path] = track['id']
+                        tagging.submit(track_path, track['thumbnail'], track['title'])
+
+        print("⬇️  Starting download process...")
+        if info and 'entries' in info and not info['entries']:
+            print("✅ Nothing to download")
+        elif info and jobs > 1 and 'entries' in info:
+            results = download_tracks_parallel([entry for entry in info['entries'] if entry], ydl_opts,
+                                               jobs, debug_mode)
+            update_manifest_titles(expected_tracks, {'entries': results})
+        elif info:
+            result = ydl.process_ie_result(info, download=True)
+            update_manifest_titles(expected_tracks, result)
+        else:
+            ydl.download([playlist_url])
 
-    print("🔄 Processing downloaded tracks...")
+    # Tracks were queued for tagging as they finished, wait for the last ones
+    print("🔄 Finishing tagging of downloaded tracks...")
+    artwork_hashes = tagging.finish()
+    for track_path, track_id in {**retagged_tracks, **finished_tracks.finished}.items():
+        record = manifest[track_id]
+        if track_path in artwork_hashes:
+            record['artwork_sha256'] = artwork_hashes[track_path]
+            record['tag_state'] = 'artwork' if artwork_hashes[track_path] else 'failed'
+        record['size'] = os.path.getsize(track_path)
     
     # Track successfully downloaded files
-    downloaded_tracks = []
+    downloaded_tracks = finished_tracks.titles + [os.path.splitext(track['path'])[0] for track in skipped_tracks]
     
-    # DEBUG: Print download directory contents before processing
-    debug_print(f"🔍 DEBUG - Files in download directory before processing:", debug_mode)
-    if debug_mode:
-        for file_name in os.listdir(download_directory):
-            file_path = os.path.join(download_directory, file_name)
-            file_size = os.path.getsize(file_path) if os.path.isfile(file_path) else 'DIR'
-            print(f"   {file_name} ({file_size} bytes)")
+    # Forget removed tracks whose files are gone too, the rest stay listed until they are deleted
+    for track in removed_tracks:
+        if not os.path.isfile(os.path.join(download_directory, track['path'])):
+            del manifest[track['id']]
+    save_download_manifest(download_directory, playlist_url, manifest)
     
-    # Process each downloaded track
-    for file_name in os.listdir(download_directory):
-        if file_name.endswith('.mp3'):
-            track_path = os.path.join(download_directory, file_name)
-            json_path = track_path.replace('.mp3', '.info.json')
-            
-            # Extract track title from filename (remove .mp3 extension)
-            track_title = file_name.replace('.mp3', '')
-            downloaded_tracks.append(track_title)
-            
-            print(f"🎵 Processing: {track_title}")
-            
-            # DEBUG: Print file processing details
-            debug_print(f"🔍 DEBUG - Processing file: {file_name}", debug_mode)
-            if debug_mode:
-                print(f"   Track path: {track_path}")
-                print(f"   JSON path: {json_path}")
-                print(f"   JSON exists: {os.path.exists(json_path)}")
-            
-            if os.path.exists(json_path):
-                with open(json_path, 'r') as f:
-                    track_info = json.load(f)
-                
-                # DEBUG: Print track info structure (but not binary data)
-                debug_print(f"🔍 DEBUG - Track info keys: {list(track_info.keys())}", debug_mode)
-                if debug_mode:
-                    # Only print non-binary track info
-                    safe_track_info = {}
-                    for key, value in track_info.items():
-                        if isinstance(value, str) and len(str(value)) < 100:  # Avoid long strings
-                            safe_track_info[key] = value
-                        elif isinstance(value, (int, float, bool)):
-                            safe_track_info[key] = value
-                        else:
-                            safe_track_info[key] = f"[{type(value).__name__}]"
-                    print(f"🔍 DEBUG - Track info (safe): {safe_track_info}")
-                
-                # Download the track image
-                if 'thumbnail' in track_info:
-                    image_url = track_info['thumbnail']
-                    print(f"🖼️  Downloading artwork for: {track_title}")
-                    debug_print(f"🔍 DEBUG - Image URL: {image_url}", debug_mode)
-                    
-                    try:
-                        image_data = requests.get(image_url).content
-                        debug_print(f"🔍 DEBUG - Downloaded image size: {len(image_data)} bytes", debug_mode)
-                        
-                        # Initialize MP3 file with ID3 tag if missing
-                        try:
-                            audio = ID3(track_path)
-                            debug_print(f"🔍 DEBUG - Existing ID3 tags: {list(audio.keys()) if audio else 'None'}", debug_mode)
-                        except ID3NoHeaderError:
-                            audio = ID3()  # Create a new ID3 tag if not present
-                            audio.save(track_path)  # Save the empty ID3 tag
-                            debug_print(f"🔍 DEBUG - Created new ID3 tag for: {track_path}", debug_mode)
-                        
-                        # Embed the image as album art in the MP3 file
-                        audio = ID3(track_path)
-                        audio['APIC'] = APIC(
-                            encoding=3,  # 3 is for utf-8
-                            mime='image/jpeg',  # Image mime type
-                            type=3,  # 3 is for album front cover
-                            desc=u'Cover',
-                            data=image_data
-                        )
-                        audio.save()
-                        print(f"✅ Artwork embedded for: {track_title}")
-                        debug_print(f"🔍 DEBUG - APIC tag added successfully", debug_mode)
-                    except Exception as e:
-                        print(f"❌ Failed to embed artwork for {track_title}: {e}")
-                        debug_print(f"🔍 DEBUG - Error details: {type(e).__name__}: {str(e)}", debug_mode)
-                
-                # Remove the JSON file after processing
-                os.remove(json_path)
-                debug_print(f"🔍 DEBUG - Removed JSON file: {json_path}", debug_mode)
-                
-                # Remove the image file if it was saved
-                image_path = track_path.replace('.mp3', '.jpg')
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-                    debug_print(f"🔍 DEBUG - Removed image file: {image_path}", debug_mode)
-    
-    # Clean up any other files or folders that are not MP3s
+    # Clean up what failed downloads and conversions left behind
     print("🧹 Cleaning up temporary files...")
-    for file_name in os.listdir(download_directory):
-        file_path = os.path.join(download_directory, file_name)
-        if not file_name.endswith('.mp3'):
-            os.remove(file_path)
-            debug_print(f"🔍 DEBUG - Removed temporary file: {file_name}", debug_mode)
+    finished_tracks.clean_up()
     
     # DEBUG: Print final state
     debug_print(f"🔍 DEBUG - Final downloaded tracks: {downloaded_tracks}", debug_mode)
@@ -267,6 +528,17 @@ def download_soundcloud_playlist(playlist_url, download_directory='downloads', d
     else:
         print("⚠️  Could not determine expected tracks - cannot analyze failures")
     
+    if incremental:
+        print(f"⏭️  Already up to date (skipped): {len(skipped_tracks)}")
+    if removed_tracks:
+        print(f"\n🗑️  TRACKS NO LONGER IN THE PLAYLIST ({len(removed_tracks)}, files kept):")
+        print("-" * 50)
+        for i, track in enumerate(removed_tracks, 1):
+            print(f"{i}. {track['title']}")
+            print(f"   File: {track['path']}{'' if os.path.isfile(os.path.join(download_directory, track['path'])) else ' (deleted)'}")
+            print(f"   ID: {track['id']}")
+        print()
+    
     print(f"📁 Final MP3 files in {download_directory}: {len(downloaded_tracks)}")
     print("="*60)
 
@@ -274,6 +546,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Download SoundCloud playlist')
     parser.add_argument('-p', '--playlist', type=str, help='SoundCloud playlist URL')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Tracks downloaded and converted in parallel (default: 1, one after another)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Only download tracks that are new or changed since the last run')
+    parser.add_argument('--list', action='store_true',
+                        help='Only print the playlist\'s track manifest (fast, nothing is downloaded)')
     
     args = parser.parse_args()
     
@@ -286,4 +564,13 @@ if __name__ == "__main__":
     print(f"🔍 DEBUG - Using playlist URL: {playlist_url}")
     print(f"🔍 DEBUG - Debug mode: {args.debug}")
     
-    download_soundcloud_playlist(playlist_url, debug_mode=args.debug)
+    if args.list:
+        tracks = get_playlist_manifest(playlist_url)
+        for i, track in enumerate(tracks, 1):
+            print(f"{i}. {track['title']}")
+            print(f"   URL: {track['url']}")
+            print(f"   ID: {track['id']}")
+        print(f"📊 Tracks in playlist: {len(tracks)}")
+    else:
+        download_soundcloud_playlist(playlist_url, debug_mode=args.debug, jobs=args.jobs,
+                                     incremental=args.incremental)
@@ -0,0 +1,131 @@
+# Peak memory benchmark for the syncer's image transform on a huge (100MP by default) image.
+#  - before: the old path, full decode then a whole-frame Lanczos resize and RGB convert
+#  - after: transform_image, JPEG draft decoding plus banded reduce + Lanczos resize
+# Every measurement runs in a fresh interpreter and reports its peak RSS over the RSS it had
+# after imports, for RGB PNG, RGBA PNG and JPEG copies of the same generated test image. Also reports how
+# far the two outputs are apart (mean absolute pixel difference, 0-255).
+#
+# Usage:
+#   python bench_image_memory.py [--megapixels 100] [--keep DIR]
+
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from PIL import Image, ImageChops, ImageStat
+
+import photo_syncer_standalone as syncer
+
+SAMPLE_CREATION_TIME = datetime(2024, 5, 17, 21, 4, 33, tzinfo=timezone.utc)
+
+
+def full_decode_transform(image_bytes, creation_time):
+    # The pre-banding path, kept here for comparison
+    with syncer.open_image(image_bytes) as img:
+        img.load()
+        exif_bytes = syncer.build_exif_with_creation_time(img.info.get('exif'), creation_time)
+        if img.width * img.height > syncer.MAX_DIMENSION:
+            aspect_ratio = img.width / img.height
+            new_height = int((syncer.MAX_DIMENSION / aspect_ratio) ** 0.5)
+            new_width = int(aspect_ratio * new_height)
+            img = img.resize((new_width, new_height), Image.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=syncer.JPEG_QUALITY, exif=exif_bytes)
+        return buffer.getvalue()
+
+
+def make_test_image(megapixels, directory):
+    # Smooth gradients plus blown-up noise: photo-like detail that still compresses reasonably
+    height = int((megapixels * 1_000_000 * 2 / 3) ** 0.5)
+    size = (height * 3 // 2, height)
+    Image.MAX_IMAGE_PIXELS = None
+    channels = [Image.linear_gradient('L').resize(size),
+                Image.radial_gradient('L').resize(size),
+                Image.effect_noise((size[0] // 16, size[1] // 16), 64).resize(size, Image.BICUBIC)]
+    img = Image.merge('RGB', channels)
+    del channels
+    paths = {
+        'PNG': os.path.join(directory, f"test_{megapixels}mp.png"),
+        'RGBA': os.path.join(directory, f"test_{megapixels}mp_alpha.png"),
+        'JPEG': os.path.join(directory, f"test_{megapixels}mp.jpg"),
+    }
+    img.save(paths['PNG'], 'PNG', compress_level=1)
+    img.save(paths['JPEG'], 'JPEG', quality=90)
+    img.putalpha(255)
+    img.save(paths['RGBA'], 'PNG', compress_level=1)
+    return size, paths
+
+
+def peak_rss_mb():
+    # VmHWM starts over at exec, ru_maxrss on Linux keeps the high-water mark of the parent
+    # that forked us (the process that just generated a 100MP image)
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(variant, path, output_path):
+    # Runs in the fresh interpreter: prints "<baseline MB> <peak MB> <seconds>"
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+    baseline = peak_rss_mb()
+    transform = full_decode_transform if variant == 'before' else syncer.transform_image
+    start = time.perf_counter()
+    jpeg_bytes = transform(image_bytes, SAMPLE_CREATION_TIME)
+    elapsed = time.perf_counter() - start
+    with open(output_path, 'wb') as f:
+        f.write(jpeg_bytes)
+    print(baseline, peak_rss_mb(), elapsed)
+
+
+def measure(variant, path, output_path):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', variant, path, output_path],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    baseline, peak, elapsed = (float(value) for value in result.stdout.split())
+    return peak - baseline, elapsed
+
+
+def mean_difference(first_path, second_path):
+    with Image.open(first_path) as first, Image.open(second_path) as second:
+        return sum(ImageStat.Stat(ImageChops.difference(first, second)).mean) / 3
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        syncer.logger.setLevel('WARNING')
+        run_child(*sys.argv[2:])
+        raise SystemExit()
+
+    parser = argparse.ArgumentParser(description='Benchmark peak memory of the image transform on a huge image')
+    parser.add_argument('--megapixels', type=int, default=100, help='Size of the generated test image')
+    parser.add_argument('--keep', help='Write the test images and outputs here instead of a temporary directory')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.keep or scratch
+        os.makedirs(directory, exist_ok=True)
+        size, paths = make_test_image(args.megapixels, directory)
+        print(f"test image {size[0]}x{size[1]} ({size[0] * size[1] / 1e6:.0f}MP), "
+              f"target {syncer.MAX_DIMENSION / (1024 * 1024):.0f}MP")
+        for image_format, path in paths.items():
+            outputs = {}
+            for variant in ('before', 'after'):
+                outputs[variant] = os.path.join(directory, f"{variant}_{os.path.basename(path)}.out.jpg")
+                peak_mb, elapsed = measure(variant, path, outputs[variant])
+                print(f"{image_format:<5} {variant:<7} peak RSS +{peak_mb:7.0f} MB  {elapsed:6.2f}s")
+            print(f"{image_format:<5} mean abs difference before/after: "
+                  f"{mean_difference(outputs['before'], outputs['after']):.2f}")
@@ -0,0 +1,111 @@
+# Benchmark for the syncer's image processing step (EXIF stamp + resize + JPEG encode).
+#  - serial vs pooled: processing a directory of PNGs on one thread vs the process pool
+#    the syncer uses during a sync run
+#  - two-pass vs fused: the old path (re-save the PNG with EXIF, then decode it again and
+#    encode the JPEG) vs the single-decode transform_image, in CPU seconds per image.
+#    Also checks that DateTimeOriginal survives into the JPEG bytes that get uploaded.
+#
+# Usage:
+#   python bench_image_processing.py path/to/sample_pngs [--workers 8] [--rounds 3]
+
+import argparse
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import piexif
+from PIL import Image
+
+import photo_syncer_standalone as syncer
+
+SAMPLE_CREATION_TIME = datetime(2024, 5, 17, 21, 4, 33, tzinfo=timezone.utc)
+
+
+def load_samples(directory):
+    samples = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.lower().endswith('.png'):
+            with open(os.path.join(directory, file_name), 'rb') as f:
+                samples.append(f.read())
+    return samples
+
+
+def two_pass_transform(image_bytes, creation_time):
+    # The pre-fusion path, kept here for comparison: PNG re-encode with EXIF, then JPEG encode
+    png_buffer = io.BytesIO()
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        exif_bytes = syncer.build_exif_with_creation_time(img.info.get('exif'), creation_time)
+        img.save(png_buffer, "PNG", exif=exif_bytes)
+
+    with Image.open(io.BytesIO(png_buffer.getvalue())) as img:
+        if img.width * img.height > syncer.MAX_DIMENSION:
+            aspect_ratio = img.width / img.height
+            new_height = int((syncer.MAX_DIMENSION / aspect_ratio) ** 0.5)
+            new_width = int(aspect_ratio * new_height)
+            img = img.resize((new_width, new_height), Image.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        jpeg_buffer = io.BytesIO()
+        img.save(jpeg_buffer, format='JPEG', quality=syncer.JPEG_QUALITY)
+        return jpeg_buffer.getvalue()
+
+
+def run_serial(samples, transform):
+    for image_bytes in samples:
+        transform(image_bytes, SAMPLE_CREATION_TIME)
+
+
+async def run_pooled(samples, image_pool):
+    await asyncio.gather(*(syncer.process_image(image_pool, image_bytes, SAMPLE_CREATION_TIME)
+                           for image_bytes in samples))
+
+
+def check_timestamp(samples):
+    jpeg_bytes = syncer.transform_image(samples[0], SAMPLE_CREATION_TIME)
+    with Image.open(io.BytesIO(jpeg_bytes)) as img:
+        exif_dict = piexif.load(img.info['exif'])
+    stamped = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode()
+    expected = SAMPLE_CREATION_TIME.strftime("%Y:%m:%d %H:%M:%S")
+    if stamped != expected:
+        raise SystemExit(f"DateTimeOriginal mismatch in upload bytes: {stamped!r} != {expected!r}")
+    print(f"DateTimeOriginal in upload bytes: {stamped} (ok)")
+
+
+def report(label, elapsed, samples):
+    total_mb = sum(len(image_bytes) for image_bytes in samples) / (1024 * 1024)
+    print(f"{label:<9} {elapsed:8.2f}s  {len(samples) / elapsed:8.2f} files/s  {total_mb / elapsed:8.2f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the syncer image processing step')
+    parser.add_argument('directory', help='Directory containing sample PNG screenshots')
+    parser.add_argument('--workers', type=int, default=syncer.IMAGE_WORKERS, help='Process pool size')
+    parser.add_argument('--rounds', type=int, default=1, help='Times to process the whole directory')
+    args = parser.parse_args()
+
+    syncer.logger.setLevel('WARNING')
+    samples = load_samples(args.directory) * args.rounds
+    if not samples:
+        raise SystemExit(f"No PNG files found in {args.directory}")
+    print(f"{len(samples)} images, {args.workers} pool workers")
+    check_timestamp(samples)
+
+    cpu_seconds = {}
+    for label, transform in (('two-pass', two_pass_transform), ('fused', syncer.transform_image)):
+        start, cpu_start = time.perf_counter(), time.process_time()
+        run_serial(samples, transform)
+        cpu_seconds[label] = time.process_time() - cpu_start
+        report(label, time.perf_counter() - start, samples)
+    print(f"CPU per image: two-pass {cpu_seconds['two-pass'] / len(samples) * 1000:.0f} ms, "
+          f"fused {cpu_seconds['fused'] / len(samples) * 1000:.0f} ms "
+          f"({1 - cpu_seconds['fused'] / cpu_seconds['two-pass']:.0%} less)")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as image_pool:
+        # Warm the pool up so process start-up isn't counted
+        list(image_pool.map(int, range(args.workers)))
+        start = time.perf_counter()
+        asyncio.run(run_pooled(samples, image_pool))
+        report('pooled', time.perf_counter() - start, samples)
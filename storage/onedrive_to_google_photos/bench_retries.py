@@ -0,0 +1,79 @@
+# Retry benchmark and self-check: runs sync_photos (through bench_sync.py) against the fake
+# services four times: with the rate limiter out of the way (rate pinned at a ceiling no host
+# reaches), clean, with a fraction of requests answered 429 + Retry-After and with a fraction
+# answered 500, and reports how much the rate limiter and the retries cost in wall time.
+# Exits non-zero unless
+#  - the clean run, which is never throttled, took at most --max-slowdown times as long as the
+#    unlimited one, i.e. the rate limiter doesn't hold back a host that never throttles, and
+#  - every faulty run still synced every file exactly once into a single album and left nothing
+#    on OneDrive, i.e. the rate limiter and retries recovered from every fault.
+#
+# Usage:
+#   python bench_retries.py [--files 40] [--image-size 640x360] [--latency 0.05] [--max-slowdown 1.5]
+#                           [--throttle-rate 0.2] [--retry-after 1] [--error-rate 0.05] [--workers 4]
+
+import argparse
+import asyncio
+
+import bench_sync
+import photo_syncer_standalone as syncer
+
+
+def check_throughput(elapsed, unlimited_elapsed, max_slowdown):
+    slowdown = elapsed / unlimited_elapsed
+    if slowdown > max_slowdown:
+        raise SystemExit(f"clean: the rate limiter held back a run that was never throttled, "
+                         f"{elapsed:.2f}s against {unlimited_elapsed:.2f}s unlimited ({slowdown:.2f}x)")
+    print(f"{'clean':<9} {slowdown:.2f}x the unlimited run (ok)")
+
+
+def check_recovery(label, files, outcome, photos, server_stats, remaining):
+    problems = []
+    if outcome is None:
+        problems.append('the sync raised')
+    elif outcome['failed'] or outcome['succeeded'] != files:
+        problems.append(f"{outcome['succeeded']} of {files} files synced, {outcome['failed']} failed")
+    if len(photos.media_items) != files:
+        problems.append(f"{len(photos.media_items)} media items for {files} files")
+    if len(photos.albums) != 1:
+        problems.append(f"{len(photos.albums)} albums created")
+    if remaining:
+        problems.append(f"{remaining} files left on OneDrive")
+    if problems:
+        raise SystemExit(f"{label}: retries did not recover from "
+                         f"{server_stats['throttled']} 429s and {server_stats['errors']} 500s: " + ', '.join(problems))
+    print(f"{label:<9} recovered from {server_stats['throttled']} 429s and {server_stats['errors']} 500s (ok)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the rate limiter and retries: full speed when never throttled, recovery from faults')
+    parser.add_argument('--files', type=int, default=40, help='Synthetic PNG screenshots to sync')
+    parser.add_argument('--image-size', default='640x360', help='Screenshot size, WIDTHxHEIGHT')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every API request')
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help='Longest the clean run may take, as a multiple of the unlimited run')
+    parser.add_argument('--throttle-rate', type=float, default=0.2, help='Fraction of API requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Fraction of API requests answered with 500')
+    parser.add_argument('--workers', type=int, default=syncer.IMAGE_WORKERS, help='Image worker processes')
+    args = parser.parse_args()
+
+    unlimited = {'RATE_LIMIT_INITIAL': 1e6, 'RATE_LIMIT_MAX': 1e6}
+    scenarios = [('unlimited', 0.0, 0.0, unlimited), ('clean', 0.0, 0.0, None),
+                 ('throttled', args.throttle_rate, 0.0, None), ('errors', 0.0, args.error_rate, None)]
+    baseline = None
+    for label, throttle_rate, error_rate, settings in scenarios:
+        run_args = argparse.Namespace(files=args.files, image_size=args.image_size, noise=False, sidecars=False,
+                                      latency=args.latency, bandwidth=None, error_rate=error_rate,
+                                      throttle_rate=throttle_rate, retry_after=args.retry_after,
+                                      workers=args.workers, metrics_summary=False, plan=False)
+        result, _, photos, server_stats, remaining = asyncio.run(bench_sync.run_benchmark(run_args, settings))
+        if throttle_rate + error_rate and not server_stats['throttled'] + server_stats['errors']:
+            raise SystemExit(f"{label}: no faults were injected, raise the rate or --files")
+        elapsed = result['elapsed']
+        baseline = baseline or elapsed
+        print(f"{label:<9} {elapsed:7.2f}s  {server_stats['requests']:5d} requests  "
+              f"{elapsed / baseline:5.2f}x the unlimited run")
+        if label == 'clean':
+            check_throughput(elapsed, baseline, args.max_slowdown)
+        check_recovery(label, args.files, result['outcome'], photos, server_stats, remaining)
@@ -0,0 +1,139 @@
+# Startup benchmark for photo_syncer_standalone.py, checked against a time budget.
+#  - import time: `python -X importtime -c "import photo_syncer_standalone"`, the cumulative
+#    import time of the module and its slowest direct imports
+#  - time to first request: starts a sync in a fresh interpreter against a local fake server
+#    and measures from process spawn until the first HTTP request reaches the server.
+#    Authentication is stubbed out (it needs real accounts), everything else runs as usual.
+# Exits non-zero when the median of either measurement is over its budget.
+#
+# Usage:
+#   python bench_startup.py [--runs 5] [--import-budget-ms 400] [--first-request-budget-ms 600]
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+import fake_services
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_BUDGET_MS = 400  # Cumulative import time of photo_syncer_standalone
+FIRST_REQUEST_BUDGET_MS = 600  # Process spawn until the first HTTP request arrives
+
+# Runs in the child interpreter: argv[1] is the fake server URL, argv[2] a scratch directory
+FIRST_REQUEST_CHILD = '''
+import asyncio, os, sys, time
+sys.path.insert(0, os.environ['SYNCER_DIR'])
+import photo_syncer_standalone as syncer
+
+class StaticCredentials(syncer.CredentialProvider):
+    async def refresh(self):
+        self.token, self.expires_at = 'token', time.time() + 3600
+
+async def authenticate(token_file=None):
+    return StaticCredentials()
+
+syncer.ONEDRIVE_API_ENDPOINT = sys.argv[1] + '/v1.0/me'
+syncer.PHOTOS_API_ENDPOINT = sys.argv[1] + '/photos/v1'
+syncer.authenticate_onedrive = authenticate
+syncer.authenticate_google_photos = authenticate
+os.chdir(sys.argv[2])
+asyncio.run(syncer.sync_photos())
+'''
+
+
+def measure_import(python=sys.executable):
+    result = subprocess.run([python, '-X', 'importtime', '-c', 'import photo_syncer_standalone'],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    # Lines look like "import time:  self [us] | cumulative | imported package", nested
+    # imports are indented by two spaces per level
+    total_us = 0
+    direct_imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if name.strip() == 'photo_syncer_standalone':
+            total_us = int(cumulative)
+        elif depth == 1:
+            direct_imports[name.strip()] = int(cumulative)
+    return total_us / 1000, direct_imports
+
+
+async def measure_first_request():
+    first_request = asyncio.get_running_loop().create_future()
+
+    @web.middleware
+    async def record_first_request(request, handler):
+        if not first_request.done():
+            first_request.set_result((time.monotonic(), f"{request.method} {request.path}"))
+        return await handler(request)
+
+    app = fake_services.make_app(fake_services.FakeGraphDrive('Pictures/Xbox Screenshots'),
+                                 photos=fake_services.FakePhotosLibrary())
+    app.middlewares.insert(0, record_first_request)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    await web.SockSite(runner, listener).start()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', FIRST_REQUEST_CHILD, f"http://127.0.0.1:{port}", scratch,
+            env={**os.environ, 'SYNCER_DIR': SCRIPT_DIR},
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            arrived, first = await asyncio.wait_for(first_request, timeout=30)
+        finally:
+            process.kill()
+            await process.wait()
+    await runner.cleanup()
+    return (arrived - started) * 1000, first
+
+
+def measure_interpreter():
+    started = time.monotonic()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return (time.monotonic() - started) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark photo syncer startup against a budget')
+    parser.add_argument('--runs', type=int, default=5, help='Measurements per metric, the median is reported')
+    parser.add_argument('--import-budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--first-request-budget-ms', type=float, default=FIRST_REQUEST_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=8, help='Slowest direct imports to list')
+    args = parser.parse_args()
+
+    interpreter_ms = statistics.median(measure_interpreter() for _ in range(args.runs))
+    imports = [measure_import() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in imports)
+    first_requests = [asyncio.run(measure_first_request()) for _ in range(args.runs)]
+    first_request_ms = statistics.median(elapsed for elapsed, _ in first_requests)
+
+    print(f"interpreter startup            {interpreter_ms:8.1f} ms")
+    print(f"import                         {import_ms:8.1f} ms  (budget {args.import_budget_ms:.0f} ms)")
+    _, direct_imports = imports[-1]
+    for name, cumulative_us in sorted(direct_imports.items(), key=lambda entry: -entry[1])[:args.top]:
+        print(f"  {name:<28} {cumulative_us / 1000:8.1f} ms")
+    print(f"time to first request          {first_request_ms:8.1f} ms  (budget {args.first_request_budget_ms:.0f} ms, "
+          f"{first_requests[-1][1]})")
+
+    over_budget = []
+    if import_ms > args.import_budget_ms:
+        over_budget.append('import')
+    if first_request_ms > args.first_request_budget_ms:
+        over_budget.append('time to first request')
+    if over_budget:
+        raise SystemExit(f"Over budget: {', '.join(over_budget)}")
@@ -0,0 +1,157 @@
+# End-to-end throughput benchmark: runs sync_photos against the local fake OneDrive and Photos
+# services (fake_services.py) with N synthetic PNG screenshots and reports files/s, MB/s, CPU
+# time and peak memory. The sync runs in its own process so the fake services' work isn't
+# counted; authentication is stubbed out (it needs real accounts), everything else runs as usual.
+# With --plan it runs the --plan dry run against the same fake OneDrive instead.
+#
+# Usage:
+#   python bench_sync.py [--files 200] [--image-size 1920x1080] [--noise]
+#                        [--latency 0.05] [--bandwidth 100] [--error-rate 0.01] [--throttle-rate 0.0]
+#                        [--workers 4] [--metrics-summary] [--plan]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+import fake_services
+import photo_syncer_standalone as syncer
+
+
+class StaticCredentials(syncer.CredentialProvider):
+    async def refresh(self):
+        self.token, self.expires_at = 'token', time.time() + 3600
+
+
+async def authenticate(token_file=None):
+    return StaticCredentials()
+
+
+def peak_rss_mb():
+    # VmHWM of this process only, ru_maxrss on Linux would include the parent's high-water mark
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_sync(hosts, scratch, workers, metrics_summary, plan, results, settings=None):
+    # Runs in the spawned sync process, state files (journal, hash index...) go to `scratch`.
+    # `hosts` maps 'graph', 'downloads' and 'photos' to the fake services' base URLs.
+    # `settings` overrides syncer module settings, e.g. {'RATE_LIMIT_INITIAL': 200.0}
+    for name, value in (settings or {}).items():
+        setattr(syncer, name, value)
+    syncer.ONEDRIVE_API_ENDPOINT = hosts['graph'] + '/v1.0/me'
+    syncer.PHOTOS_API_ENDPOINT = hosts['photos'] + '/photos/v1'
+    syncer.authenticate_onedrive = authenticate
+    syncer.authenticate_google_photos = authenticate
+    syncer.IMAGE_WORKERS = workers
+    syncer.PIPELINE_CONCURRENCY['transform'] = workers
+    syncer.logger.setLevel('INFO' if metrics_summary else 'WARNING')
+    os.chdir(scratch)
+
+    start = time.perf_counter()
+    outcome = asyncio.run(syncer.plan_sync() if plan else syncer.sync_photos(metrics_summary=metrics_summary))
+    elapsed = time.perf_counter() - start
+    # The image pool has been shut down and its workers reaped, so RUSAGE_CHILDREN covers them
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    worker_peak = children.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else children.ru_maxrss / 1024
+    host_names = {urlsplit(url).netloc: name for name, url in hosts.items()}
+    results.put({
+        'outcome': outcome,
+        'elapsed': elapsed,
+        'cpu_main': own.ru_utime + own.ru_stime,
+        'cpu_workers': children.ru_utime + children.ru_stime,
+        'peak_main_mb': peak_rss_mb(),
+        'peak_worker_mb': worker_peak,
+        'rate_limiters': {host_names.get(limiter.host, limiter.host): (limiter.rate, limiter.retries)
+                          for limiter in syncer.rate_limiters.values()},
+    })
+
+
+async def run_benchmark(args, settings=None):
+    width, height = (int(value) for value in args.image_size.split('x'))
+    drive = fake_services.FakeGraphDrive(syncer.ONEDRIVE_FOLDER, image_size=(width, height), noise=args.noise)
+    drive.add_screenshots(args.files, with_sidecars=args.sidecars)
+    source_bytes = sum(item['size'] for item in drive.items.values() if item['name'].endswith('.png'))
+    photos = fake_services.FakePhotosLibrary()
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
+    app = fake_services.make_app(drive, args.throttle_rate, args.retry_after, photos,
+                                 args.latency, bandwidth, args.error_rate)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    # Separate ports for the Graph API, downloads and Photos, as the real services are separate
+    # hosts: each gets its own rate limiter in the syncer
+    hosts = {}
+    for name in ('graph', 'downloads', 'photos'):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        await web.SockSite(runner, listener).start()
+        hosts[name] = f"http://127.0.0.1:{listener.getsockname()[1]}"
+    drive.download_origin = hosts['downloads']
+
+    # Spawned, not forked: the sync process must not share this process's server sockets
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as scratch:
+        process = context.Process(target=run_sync, args=(hosts, scratch, args.workers, args.metrics_summary,
+                                                         args.plan, results, settings))
+        process.start()
+        await asyncio.to_thread(process.join)
+    await runner.cleanup()
+    if process.exitcode != 0:
+        raise SystemExit(f"Sync process exited with {process.exitcode}")
+    return results.get(), source_bytes, photos, app['stats'], len(drive.items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the photo syncer against local fake services')
+    parser.add_argument('--files', type=int, default=200, help='Synthetic PNG screenshots to sync')
+    parser.add_argument('--image-size', default='1920x1080', help='Screenshot size, WIDTHxHEIGHT')
+    parser.add_argument('--noise', action='store_true', help='Random pixels (realistic sizes and CPU cost)')
+    parser.add_argument('--sidecars', action='store_true', help='Add an .xjr sidecar next to every screenshot')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every API request')
+    parser.add_argument('--bandwidth', type=float, help='MB/s of the link shared by all uploads and downloads')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of API requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of API requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--workers', type=int, default=syncer.IMAGE_WORKERS, help='Image worker processes')
+    parser.add_argument('--metrics-summary', action='store_true', help="Log the syncer's per-stage summary table")
+    parser.add_argument('--plan', action='store_true', help='Run the --plan dry run instead of a sync')
+    args = parser.parse_args()
+
+    result, source_bytes, photos, server_stats, remaining = asyncio.run(run_benchmark(args))
+    elapsed = result['elapsed']
+    if args.plan:
+        print(f"plan of {args.files} files in {elapsed:.2f}s: {result['outcome']}")
+        raise SystemExit()
+
+    outcome = result['outcome'] or {}
+    succeeded = outcome.get('succeeded', 0)
+    uploaded_bytes = photos.stats['uploaded_bytes']
+    cpu_total = result['cpu_main'] + result['cpu_workers']
+    print(f"{succeeded} of {args.files} files synced ({outcome.get('failed', '?')} failed), "
+          f"{source_bytes / 1024 ** 2:.1f} MB of PNG in, {uploaded_bytes / 1024 ** 2:.1f} MB of JPEG uploaded")
+    print(f"wall time      {elapsed:8.2f} s")
+    print(f"throughput     {succeeded / elapsed:8.2f} files/s  {source_bytes / 1024 ** 2 / elapsed:8.2f} MB/s")
+    print(f"CPU            {cpu_total:8.2f} s  (main process {result['cpu_main']:.2f} s, image workers "
+          f"{result['cpu_workers']:.2f} s, {cpu_total / elapsed:.1f} cores busy on average)")
+    print(f"peak memory    {result['peak_main_mb']:8.1f} MB main process, "
+          f"{result['peak_worker_mb']:.1f} MB largest image worker")
+    print(f"fake services  {server_stats['requests']} requests, {server_stats['throttled']} throttled, "
+          f"{server_stats['errors']} errors injected; {len(photos.media_items)} media items created, "
+          f"{remaining} files left on OneDrive")
+    print("rate limiters  " + ', '.join(f"{name} settled at {rate:.1f} req/s ({retries} retries)"
+                                        for name, (rate, retries) in sorted(result['rate_limiters'].items()))
+          + f"  (ceiling {syncer.RATE_LIMIT_MAX:.0f} req/s)")
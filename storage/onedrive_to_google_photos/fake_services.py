@@ -0,0 +1,500 @@
+# Local stand-ins for the Microsoft Graph drive endpoints and the Google Photos Library API
+# used by photo_syncer_standalone.py. Serves folders of synthetic PNG screenshots with paged
+# /children listings, /delta queries, downloads and ($batch) deletes, and accepts uploads, batchCreate
+# and album calls, so the syncer can be exercised without touching a real OneDrive or library.
+#
+# Usage:
+#   python fake_services.py --files 500 --page-size 100 --port 8080
+# Like the real services, the Graph API, file downloads and the Photos API are served on separate
+# hosts (ports 8080, 8081 and 8082), so the syncer rate-limits each on its own. Point the syncer at it:
+#   ONEDRIVE_API_ENDPOINT = "http://127.0.0.1:8080/v1.0/me"
+#   PHOTOS_API_ENDPOINT = "http://127.0.0.1:8082/photos/v1"
+# Add more files while it runs (to try incremental /delta syncs):
+#   curl -X POST "http://127.0.0.1:8080/_fake/files?count=10"
+# Serve several folders (e.g. for a multi-source --config run), files are spread across them:
+#   python fake_services.py --folder "Pictures/Xbox Screenshots" --folder "Pictures/Console 2"
+# Answer 10% of API requests (and of the requests inside a $batch) with 429 + Retry-After
+# to exercise the syncer's rate limiter:
+#   python fake_services.py --throttle-rate 0.1 --retry-after 1
+# Cut 30% of resumable upload chunk requests mid-stream (after storing part of the chunk):
+#   python fake_services.py --drop-upload-rate 0.3
+# Behave like a remote service: 80ms per request, a shared 50 MB/s link, 1% of requests failing
+# with 500, and screenshots full of random pixels (realistic sizes and image processing cost):
+#   python fake_services.py --latency 0.08 --bandwidth 50 --error-rate 0.01 --noise
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+EXIF_DATE = re.compile(rb'(\d{4}):(\d\d):(\d\d) (\d\d):(\d\d):(\d\d)\x00')
+
+
+def make_png(width, height, seed, noise=False):
+    # Minimal RGB PNG built with the standard library only, each seed gives different content.
+    # A flat colour by default (tiny files); with noise, random pixels that don't compress.
+    def chunk(chunk_type, data):
+        body = chunk_type + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    if noise:
+        pixels = random.Random(seed).randbytes(width * 3 * height)
+        raw = b''.join(b'\x00' + pixels[y * width * 3:(y + 1) * width * 3] for y in range(height))
+        compressed = zlib.compress(raw, 0)  # Stored, compressing noise only costs time
+    else:
+        pixel = bytes([(seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256])
+        row = b'\x00' + pixel * width
+        compressed = zlib.compress(row * height, 6)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', compressed) + chunk(b'IEND', b''))
+
+
+class FakeGraphDrive:
+    def __init__(self, folder_path, page_size=200, image_size=(1920, 1080), noise=False):
+        self.folder_path = folder_path.strip('/')  # Folder files are added to by default
+        self.folders = {self.folder_path}
+        self.page_size = page_size
+        self.image_size = image_size
+        self.noise = noise
+        self.items = {}  # item id -> Graph driveItem metadata
+        self.item_folders = {}  # item id -> folder path, kept after deletes for /delta
+        self.content = {}  # item id -> file bytes
+        self.changes = []  # Change log for /delta: (sequence number, item id)
+        self.sequence = 0
+        self.next_id = 1
+        # Download URLs point at this origin when set, like Graph's, which point at a separate
+        # download host; by default at the origin the listing was requested from
+        self.download_origin = None
+
+    def add_file(self, name, data, created=None, folder=None):
+        item_id = f"FAKE{self.next_id:08d}"
+        self.next_id += 1
+        created = created or datetime.now(timezone.utc)
+        folder = (folder or self.folder_path).strip('/')
+        self.folders.add(folder)
+        self.item_folders[item_id] = folder
+        self.items[item_id] = {
+            'id': item_id,
+            'name': name,
+            'size': len(data),
+            'parentReference': {'path': f"/drive/root:/{folder}"},
+            'eTag': f'"{{{item_id}}},1"',
+            'createdDateTime': created.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'file': {
+                'mimeType': 'image/png' if name.lower().endswith('.png') else 'application/octet-stream',
+                'hashes': {'sha1Hash': hashlib.sha1(data).hexdigest().upper()},
+            },
+        }
+        self.content[item_id] = data
+        self._record_change(item_id)
+        return item_id
+
+    def add_screenshots(self, count, with_sidecars=False, folder=None):
+        start = datetime.now(timezone.utc) - timedelta(days=1)
+        width, height = self.image_size
+        for _ in range(count):
+            index = self.next_id
+            name = f"Screenshot {index:06d}.png"
+            self.add_file(name, make_png(width, height, index, self.noise), start + timedelta(seconds=index), folder)
+            if with_sidecars:
+                self.add_file(f"Screenshot {index:06d}.xjr", b'<xjr/>', folder=folder)
+
+    def delete_file(self, item_id):
+        if item_id not in self.items:
+            return False
+        del self.items[item_id]
+        del self.content[item_id]
+        self._record_change(item_id)
+        return True
+
+    def _record_change(self, item_id):
+        self.sequence += 1
+        self.changes.append((self.sequence, item_id))
+
+    def _download_url(self, request, item_id):
+        return f"{self.download_origin or request.url.origin()}/download/{item_id}"
+
+    def _item_view(self, request, item_id):
+        if item_id not in self.items:
+            return {'id': item_id, 'deleted': {'state': 'deleted'}}
+        item = dict(self.items[item_id])
+        item['@microsoft.graph.downloadUrl'] = self._download_url(request, item_id)
+        return item
+
+    def _page(self, item_ids, request, base_link):
+        # The skip token is the last item id of the previous page, so files deleted while a
+        # client is still paging don't shift later pages
+        after = request.query.get('$skiptoken', '')
+        remaining = [item_id for item_id in sorted(item_ids) if item_id > after]
+        page = remaining[:self.page_size]
+        body = {'value': [self._item_view(request, item_id) for item_id in page]}
+        if len(remaining) > self.page_size:
+            separator = '&' if '?' in base_link else '?'
+            body['@odata.nextLink'] = f"{base_link}{separator}$skiptoken={page[-1]}"
+        return body
+
+    async def handle_root_path(self, request):
+        # /v1.0/me/drive/root:/{folder}:/children, /v1.0/me/drive/root:/{folder}:/delta
+        # or the folder itself: /v1.0/me/drive/root:/{folder}
+        tail = request.match_info['tail'].strip('/')
+        if ':/' in tail:
+            folder, _, action = tail.rpartition(':/')
+        else:
+            folder, action = tail.rstrip(':'), ''
+        folder = folder.strip('/')
+        if folder not in self.folders:
+            return web.json_response({'error': {'code': 'itemNotFound'}}, status=404)
+        folder_items = [item_id for item_id in self.items if self.item_folders[item_id] == folder]
+
+        base_link = f"{request.url.origin()}{request.path}"
+        if action == '':
+            return web.json_response({'id': f"FOLDER-{folder}", 'name': folder.rpartition('/')[2],
+                                      'folder': {'childCount': len(folder_items)}})
+
+        if action == 'children':
+            return web.json_response(self._page(folder_items, request, base_link))
+
+        if action == 'delta':
+            since = int(request.query.get('token', 0))
+            # Changes made while the client is paging belong to the next delta round
+            upto = int(request.query.get('upto', self.sequence))
+            if since > self.sequence:
+                return web.json_response({'error': {'code': 'resyncRequired'}}, status=410)
+            # Latest state of every item changed between the two tokens
+            changed = {item_id for seq, item_id in self.changes
+                       if since < seq <= upto and self.item_folders[item_id] == folder}
+            if since == 0:
+                changed = {item_id for item_id in changed if item_id in self.items}
+            body = self._page(changed, request, f"{base_link}?token={since}&upto={upto}")
+            if '@odata.nextLink' not in body:
+                body['@odata.deltaLink'] = f"{base_link}?token={upto}"
+            return web.json_response(body)
+
+        return web.json_response({'error': {'code': 'invalidRequest'}}, status=400)
+
+    async def handle_download(self, request):
+        item_id = request.match_info['item_id']
+        if item_id not in self.content:
+            return web.Response(status=404)
+        return web.Response(body=self.content[item_id], content_type='application/octet-stream')
+
+    async def handle_item_content(self, request):
+        item_id = request.match_info['item_id']
+        if item_id not in self.content:
+            return web.json_response({'error': {'code': 'itemNotFound'}}, status=404)
+        raise web.HTTPFound(self._download_url(request, item_id))
+
+    async def handle_item_delete(self, request):
+        if not self.delete_file(request.match_info['item_id']):
+            return web.json_response({'error': {'code': 'itemNotFound'}}, status=404)
+        return web.Response(status=204)
+
+    async def handle_batch(self, request):
+        # JSON batching: only the DELETE /me/drive/items/{id} requests the syncer sends are supported
+        requests = (await request.json()).get('requests', [])
+        if not 0 < len(requests) <= 20:
+            return web.json_response({'error': {'code': 'invalidRequest',
+                                                'message': 'A batch holds 1 to 20 requests'}}, status=400)
+        throttle_rate, retry_after = request.app['throttle']
+        responses = []
+        for sub_request in requests:
+            prefix, _, item_id = sub_request['url'].rpartition('/')
+            if sub_request['method'] != 'DELETE' or prefix != '/me/drive/items':
+                responses.append({'id': sub_request['id'], 'status': 400,
+                                  'body': {'error': {'code': 'invalidRequest'}}})
+            elif random.random() < throttle_rate:
+                request.app['stats']['throttled'] += 1
+                responses.append({'id': sub_request['id'], 'status': 429,
+                                  'headers': {'Retry-After': str(retry_after)},
+                                  'body': {'error': {'code': 'activityLimitReached'}}})
+            elif self.delete_file(item_id):
+                responses.append({'id': sub_request['id'], 'status': 204})
+            else:
+                responses.append({'id': sub_request['id'], 'status': 404,
+                                  'body': {'error': {'code': 'itemNotFound'}}})
+        return web.json_response({'responses': responses})
+
+    async def handle_add_files(self, request):
+        count = int(request.query.get('count', 1))
+        self.add_screenshots(count, folder=request.query.get('folder'))
+        return web.json_response({'added': count, 'total': len(self.items)})
+
+    async def handle_state(self, request):
+        return web.json_response({'files': len(self.items), 'sequence': self.sequence, **request.app['stats']})
+
+    def add_routes(self, app):
+        app.router.add_get('/v1.0/me/drive/root:{tail:.*}', self.handle_root_path)
+        app.router.add_get('/v1.0/me/drive/items/{item_id}/content', self.handle_item_content)
+        app.router.add_delete('/v1.0/me/drive/items/{item_id}', self.handle_item_delete)
+        app.router.add_post('/v1.0/$batch', self.handle_batch)
+        app.router.add_get('/download/{item_id}', self.handle_download)
+        app.router.add_post('/_fake/files', self.handle_add_files)
+        app.router.add_get('/_fake/state', self.handle_state)
+
+
+def media_creation_time(data):
+    # Like Photos, the first EXIF date in the upload (the syncer only stamps DateTimeOriginal),
+    # else the time of upload. Taken as UTC, which is what the syncer stamps.
+    match = EXIF_DATE.search(data[:64 * 1024])
+    if match:
+        created = datetime(*(int(value) for value in match.groups()), tzinfo=timezone.utc)
+    else:
+        created = datetime.now(timezone.utc).replace(microsecond=0)
+    return created.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakePhotosLibrary:
+    UPLOAD_GRANULARITY = 256 * 1024
+
+    def __init__(self, drop_upload_rate=0.0):
+        self.drop_upload_rate = drop_upload_rate
+        self.uploads = {}  # upload token -> uploaded bytes
+        self.upload_sessions = {}  # resumable session id -> {'size': declared size, 'data': bytearray, 'token': ...}
+        self.stats = {'chunks': 0, 'dropped': 0, 'uploaded_bytes': 0}
+        self.albums = {}  # album id -> album resource
+        self.media_items = {}  # media item id -> media item resource
+        self.next_id = 1
+
+    def _new_id(self, prefix):
+        new_id = f"{prefix}{self.next_id:08d}"
+        self.next_id += 1
+        return new_id
+
+    def _album_response(self, album_id):
+        album = self.albums.get(album_id)
+        if album is None:
+            return web.json_response({'error': {'code': 404, 'status': 'NOT_FOUND'}}, status=404)
+        return web.json_response(album)
+
+    def _page(self, values, request, key, page_token):
+        start = int(page_token or 0)
+        page_size = int(request.query.get('pageSize', 50))
+        body = {key: values[start:start + page_size]}
+        if start + page_size < len(values):
+            body['nextPageToken'] = str(start + page_size)
+        return body
+
+    async def handle_upload(self, request):
+        if request.headers.get('X-Goog-Upload-Protocol') == 'resumable':
+            if request.headers.get('X-Goog-Upload-Command') != 'start':
+                return web.Response(status=400, text='Expected X-Goog-Upload-Command: start')
+            session_id = self._new_id('SESSION')
+            self.upload_sessions[session_id] = {'size': int(request.headers['X-Goog-Upload-Raw-Size']),
+                                                'data': bytearray(), 'token': None}
+            return web.Response(headers={
+                'X-Goog-Upload-Status': 'active',
+                'X-Goog-Upload-URL': f"{request.url.origin()}/photos/v1/uploads/resumable/{session_id}",
+                'X-Goog-Upload-Chunk-Granularity': str(self.UPLOAD_GRANULARITY),
+            })
+        data = await request.read()
+        if not data:
+            return web.Response(status=400, text='Empty upload')
+        token = self._new_id('UPLOAD')
+        self.uploads[token] = data
+        self.stats['uploaded_bytes'] += len(data)
+        return web.Response(text=token)
+
+    async def handle_resumable_upload(self, request):
+        upload = self.upload_sessions.get(request.match_info['session_id'])
+        if upload is None:
+            return web.Response(status=404, text='Unknown upload session')
+        commands = [command.strip() for command in request.headers.get('X-Goog-Upload-Command', '').split(',')]
+        received = len(upload['data'])
+        status_headers = {'X-Goog-Upload-Status': 'final' if upload['token'] else 'active',
+                          'X-Goog-Upload-Size-Received': str(received)}
+        if commands == ['query']:
+            return web.Response(headers=status_headers)
+        if 'upload' not in commands or upload['token']:
+            return web.Response(status=400, headers=status_headers, text='Bad upload command')
+        if int(request.headers.get('X-Goog-Upload-Offset', -1)) != received:
+            return web.Response(status=400, headers=status_headers, text=f"Expected offset {received}")
+
+        self.stats['chunks'] += 1
+        if random.random() < self.drop_upload_rate:
+            # Keep the first part of the chunk, then drop the connection like a flaky network would
+            self.stats['dropped'] += 1
+            chunk_length = int(request.headers.get('Content-Length', 0))
+            upload['data'] += await request.content.read(chunk_length // 2)
+            request.transport.abort()
+            return web.Response(status=500)
+
+        upload['data'] += await request.read()
+        if len(upload['data']) > upload['size']:
+            return web.Response(status=400, text='More bytes than X-Goog-Upload-Raw-Size')
+        if 'finalize' not in commands:
+            return web.Response(headers={'X-Goog-Upload-Status': 'active'})
+        if len(upload['data']) != upload['size']:
+            return web.Response(status=400, text='Finalized before all bytes were received')
+        upload['token'] = self._new_id('UPLOAD')
+        self.uploads[upload['token']] = bytes(upload['data'])
+        self.stats['uploaded_bytes'] += upload['size']
+        return web.Response(text=upload['token'], headers={'X-Goog-Upload-Status': 'final'})
+
+    async def handle_batch_create(self, request):
+        body = await request.json()
+        new_media_items = body.get('newMediaItems', [])
+        if not 0 < len(new_media_items) <= 50:
+            return web.json_response({'error': {'code': 400, 'status': 'INVALID_ARGUMENT'}}, status=400)
+        album = self.albums.get(body.get('albumId'))
+        results = []
+        for new_media_item in new_media_items:
+            simple_item = new_media_item['simpleMediaItem']
+            if simple_item['uploadToken'] not in self.uploads:
+                results.append({'uploadToken': simple_item['uploadToken'],
+                                'status': {'code': 3, 'message': 'Invalid upload token'}})
+                continue
+            data = self.uploads.pop(simple_item['uploadToken'])
+            media_item = {'id': self._new_id('MEDIA'), 'filename': simple_item.get('fileName'),
+                          'description': new_media_item.get('description', ''),
+                          'mediaMetadata': {'creationTime': media_creation_time(data)}}
+            self.media_items[media_item['id']] = media_item
+            if album is not None:
+                album['mediaItemIds'].append(media_item['id'])
+                album['mediaItemsCount'] = str(len(album['mediaItemIds']))
+            results.append({'uploadToken': simple_item['uploadToken'],
+                            'status': {'message': 'Success'}, 'mediaItem': media_item})
+        return web.json_response({'newMediaItemResults': results})
+
+    async def handle_search(self, request):
+        body = await request.json()
+        album = self.albums.get(body.get('albumId'))
+        if album is None:
+            return web.json_response({'error': {'code': 404, 'status': 'NOT_FOUND'}}, status=404)
+        media_items = [self.media_items[media_id] for media_id in album['mediaItemIds']]
+        return web.json_response(self._page(media_items, request, 'mediaItems', body.get('pageToken')))
+
+    async def handle_list_albums(self, request):
+        albums = [{k: v for k, v in album.items() if k != 'mediaItemIds'} for album in self.albums.values()]
+        return web.json_response(self._page(albums, request, 'albums', request.query.get('pageToken')))
+
+    async def handle_create_album(self, request):
+        body = await request.json()
+        album_id = self._new_id('ALBUM')
+        self.albums[album_id] = {'id': album_id, 'title': body['album']['title'],
+                                 'mediaItemsCount': '0', 'mediaItemIds': []}
+        return self._album_response(album_id)
+
+    async def handle_album(self, request):
+        # /albums/{id} and /albums/{id}:share share one path segment
+        album_id, _, action = request.match_info['album'].partition(':')
+        if request.method == 'POST' and action == 'share':
+            if album_id not in self.albums:
+                return self._album_response(album_id)
+            body = await request.json()
+            self.albums[album_id]['shareInfo'] = {'sharedAlbumOptions': body.get('sharedAlbumOptions', {})}
+            return web.json_response({'shareInfo': self.albums[album_id]['shareInfo']})
+        return self._album_response(album_id)
+
+    def add_routes(self, app):
+        app.router.add_post('/photos/v1/uploads', self.handle_upload)
+        app.router.add_post('/photos/v1/uploads/resumable/{session_id}', self.handle_resumable_upload)
+        app.router.add_post('/photos/v1/mediaItems:batchCreate', self.handle_batch_create)
+        app.router.add_post('/photos/v1/mediaItems:search', self.handle_search)
+        app.router.add_get('/photos/v1/albums', self.handle_list_albums)
+        app.router.add_post('/photos/v1/albums', self.handle_create_album)
+        app.router.add_route('*', '/photos/v1/albums/{album}', self.handle_album)
+
+
+def make_app(drive, throttle_rate=0.0, retry_after=1, photos=None, latency=0.0, bandwidth=None, error_rate=0.0):
+    # latency: seconds added to every request. bandwidth: bytes per second of one link shared by
+    # all request and response bodies. error_rate: fraction of requests answered with a 500.
+    link = {'free_at': 0.0}
+
+    async def transfer(size):
+        # Bodies queue up on the shared link, each one takes size / bandwidth once it's its turn
+        now = asyncio.get_running_loop().time()
+        link['free_at'] = max(now, link['free_at']) + size / bandwidth
+        await asyncio.sleep(link['free_at'] - now)
+
+    @web.middleware
+    async def inject_faults(request, handler):
+        if request.path.startswith('/_fake/'):
+            return await handler(request)
+        request.app['stats']['requests'] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < throttle_rate:
+            request.app['stats']['throttled'] += 1
+            return web.json_response({'error': {'code': 'activityLimitReached'}}, status=429,
+                                     headers={'Retry-After': str(retry_after)})
+        if random.random() < error_rate:
+            request.app['stats']['errors'] += 1
+            return web.json_response({'error': {'code': 'generalException'}}, status=500)
+        if bandwidth and request.content_length:
+            await transfer(request.content_length)
+        response = await handler(request)
+        if bandwidth and isinstance(getattr(response, 'body', None), (bytes, bytearray)):
+            await transfer(len(response.body))
+        return response
+
+    app = web.Application(middlewares=[inject_faults], client_max_size=1024 ** 3)
+    app['stats'] = {'requests': 0, 'throttled': 0, 'errors': 0}
+    app['throttle'] = (throttle_rate, retry_after)
+    drive.add_routes(app)
+    if photos is not None:
+        photos.add_routes(app)
+    return app
+
+
+def serve_app(app, host, ports):
+    # Serves one app on several ports until interrupted: each port is a separate host to a client
+    # (and its per-host rate limiter), while the request stats and the shared link stay in common
+    async def serve():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        for port in ports:
+            await web.TCPSite(runner, host, port).start()
+            print(f"Serving on http://{host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fake OneDrive (Microsoft Graph) server for the photo syncer')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--folder', action='append',
+                        help='OneDrive folder path to serve, repeat for several (default: Pictures/Xbox Screenshots)')
+    parser.add_argument('--files', type=int, default=100, help='Number of synthetic screenshots to start with')
+    parser.add_argument('--page-size', type=int, default=200, help='Items per /children or /delta page')
+    parser.add_argument('--sidecars', action='store_true', help='Add an .xjr sidecar next to every screenshot')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of API requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--drop-upload-rate', type=float, default=0.0,
+                        help='Fraction of resumable upload chunks whose connection is cut mid-stream')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every API request')
+    parser.add_argument('--bandwidth', type=float, help='MB/s of the link shared by all uploads and downloads')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of API requests answered with 500')
+    parser.add_argument('--noise', action='store_true',
+                        help='Screenshots of random pixels (realistic sizes) instead of a flat colour')
+    args = parser.parse_args()
+
+    folders = args.folder or ['Pictures/Xbox Screenshots']
+    drive = FakeGraphDrive(folders[0], page_size=args.page_size, noise=args.noise)
+    for i, folder in enumerate(folders):
+        # Spread the files evenly, the first folders get the remainder
+        drive.add_screenshots(args.files // len(folders) + (i < args.files % len(folders)),
+                              with_sidecars=args.sidecars, folder=folder)
+    for folder in folders:
+        print(f"Serving {sum(f == folder for f in drive.item_folders.values())} files from '{folder}'")
+    print(f"Set ONEDRIVE_API_ENDPOINT = \"http://{args.host}:{args.port}/v1.0/me\" in the syncer")
+    print(f"Set PHOTOS_API_ENDPOINT = \"http://{args.host}:{args.port + 2}/photos/v1\" in the syncer")
+    drive.download_origin = f"http://{args.host}:{args.port + 1}"
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
+    app = make_app(drive, args.throttle_rate, args.retry_after, FakePhotosLibrary(args.drop_upload_rate),
+                   args.latency, bandwidth, args.error_rate)
+    serve_app(app, args.host, [args.port, args.port + 1, args.port + 2])
@@ -1,29 +1,21 @@
-# pip install requests msal google-auth-oauthlib google-api-python-client Pillow 
+# pip install requests msal google-auth-oauthlib Pillow 
 
 import asyncio, aiohttp, aiofiles
-from datetime import datetime, timedelta
-import requests, os, time, os, io
-
-from msal import ConfidentialClientApplication
-from msal import PublicClientApplication, SerializableTokenCache
-from PIL import Image
-import boto3
-
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from datetime import datetime, timedelta, timezone
+import os, time, io, json, sqlite3, base64, argparse, random, math, signal, multiprocessing, tempfile
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 import logging
-import os
-from datetime import datetime
-import pytz
-from PIL.ExifTags import TAGS
-import piexif
-from PIL.PngImagePlugin import PngInfo
-import re
+from concurrent.futures import ProcessPoolExecutor
+
+# msal, the Google auth libraries, PIL, piexif and boto3 are imported where they are used.
+# Together they take longer to import than everything above, and none of them is needed
+# before the first HTTP request: auth is usually served from token caches, and PIL only
+# loads with the first downloaded image (the main process reads image headers in a thread to
+# size the memory budget, the worker processes do the decoding).
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
@@ -42,6 +34,7 @@ AUTHORITY_ONEDRIVE = 'https://login.microsoftonline.com/consumers'
 ONEDRIVE_API_ENDPOINT = "https://graph.microsoft.com/v1.0/me"
 # ONEDRIVE_USER_PRINCIPAL_NAME = ""
 TOKEN_FILE_ONEDRIVE = 'onedrive_token.json'
+TOKEN_REFRESH_MARGIN = 5 * 60  # Seconds before expiry at which access tokens (OneDrive and Google) are refreshed
 ONEDRIVE_FOLDER = "Pictures/Xbox Screenshots"
 # SCOPES_ONEDRIVE = ['Files.ReadWrite.All', 'User.Read.All']
 SCOPES_ONEDRIVE = ['Files.Read', 'Files.ReadWrite']
@@ -59,146 +52,678 @@ SCOPES_GOOGLE = [
     'https://www.googleapis.com/auth/photoslibrary.readonly',
     'https://www.googleapis.com/auth/photoslibrary'
 ]
+PHOTOS_API_ENDPOINT = 'https://photoslibrary.googleapis.com/v1'
+ALBUM_CACHE_FILE = 'album_cache.json'  # Resolved album ids, keyed by album title
 
 # Utils
-TRANSFERS_FOLDER = 'transfers'
-MAX_BATCH_SIZE = 20
-UPLOAD_DELAY = 1  # Delay in seconds between batch uploads
+TRANSFERS_FOLDER = 'transfers'  # Only used for downloads spilled to disk
+STREAM_SPILL_THRESHOLD = 64 * 1024 * 1024  # Downloads above this size go to TRANSFERS_FOLDER instead of memory (0 = always disk)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read from the download stream at a time
+JOURNAL_FILE = 'sync_journal.db'  # SQLite journal of per-file progress, lets a crashed run resume
+UPLOAD_TOKEN_TTL = timedelta(hours=23)  # Photos upload tokens expire after a day, re-upload older ones
+HASH_INDEX_FILE = 'content_hashes.bin'  # Graph content hashes of every uploaded file (dedup index)
+USE_DELTA_QUERY = False  # Only list files added since the last successful run (Graph /delta)
+DELTA_TOKEN_FILE = 'onedrive_delta.json'  # Persisted delta links, keyed by OneDrive folder
+RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024  # Uploads of this size and up use the resumable protocol (0 = always)
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Bytes per resumable upload request, rounded down to the server's granularity
+MAX_BATCH_SIZE = 50  # mediaItems:batchCreate accepts at most 50 items per call
 MAX_DIMENSION = 16 * 1024 * 1024  # 16MP
 JPEG_QUALITY = 85
+IMAGE_WORKERS = os.cpu_count() or 1  # Processes used for decoding, resizing and JPEG encoding
+IMAGE_MEMORY_BUDGET = 1024 * 1024 * 1024  # Decoded image bytes all image workers may hold at once, big images wait for room
+RESIZE_BAND_ROWS = 256  # Output rows resampled at a time, bounds the resize buffers for huge images
+RESIZE_REDUCING_GAP = 3.0  # Box-reduce by an integer factor first while the source is over 3x the target, then Lanczos
+
+# Transfer pipeline: download -> transform (EXIF + resize + JPEG) -> upload bytes -> batchCreate -> OneDrive $batch delete
+PIPELINE_CONCURRENCY = {  # Parallel workers per stage
+    'download': 4,
+    'transform': IMAGE_WORKERS,
+    'upload': 4,
+    'batch_create': 1,
+    'delete': 2,
+}
+PIPELINE_QUEUE_SIZE = 20  # Max files waiting between two stages
+BATCH_CREATE_LINGER = 2  # Seconds to wait for a batchCreate batch to fill up
+GRAPH_BATCH_SIZE = 20  # Graph $batch accepts at most 20 requests per call
+DELETE_BATCH_LINGER = 1  # Seconds to wait for a batch of OneDrive deletes to fill up
+PIPELINE_DONE = object()  # End-of-stream marker passed between pipeline stages
+
+DAEMON_INTERVAL = 15 * 60  # Seconds between OneDrive polls in --daemon mode (SIGUSR1 polls right away)
+SYNC_WORKERS = 2  # Worker processes for --config runs, each syncs one source at a time
+STATE_ROOT = 'state'  # --config runs keep each source's journal, hash index etc. in STATE_ROOT/<source name>
+
+# Run metrics
+METRICS_FILE = None  # Write run metrics here at the end of a sync: *.prom for Prometheus text format, else JSON
+METRICS_SUMMARY = False  # Log a per-stage summary table at the end of a sync
+METRICS_SAMPLE_INTERVAL = 0.5  # Seconds between pipeline queue depth samples
+METRICS_STAGE_ORDER = ['list', 'download', 'transform', 'decode', 'exif', 'resize', 'encode',
+                       'upload', 'batch_create', 'delete']
+
+# HTTP connection pool (one pooled session is shared by the whole sync run)
+HTTP_POOL_LIMIT = 64  # Total open connections across all hosts
+HTTP_POOL_LIMIT_PER_HOST = 8  # Open connections per host (Graph, download CDN, Photos)
+HTTP_KEEPALIVE_TIMEOUT = 60  # Seconds an idle connection is kept for reuse
+HTTP_DNS_CACHE_TTL = 300  # Seconds resolved host addresses are cached
+
+# Adaptive rate limiting (one token bucket per API host) and retries
+RATE_LIMIT_INITIAL = 50.0  # Requests per second a host starts at
+RATE_LIMIT_MIN = 0.5  # Requests per second floor after repeated throttling
+RATE_LIMIT_MAX = 200.0  # Requests per second ceiling
+RATE_LIMIT_SLOW_START = 2.0  # Rate multiplier for each second's worth of successful requests, until the first throttle
+RATE_LIMIT_INCREASE = 1.0  # Requests per second added for each second's worth of successful requests after that
+RATE_LIMIT_DECREASE = 0.5  # Rate multiplier applied when a host throttles us (429/503)
+MAX_RETRIES = 5  # Retries per request for transient errors
+RETRY_BASE_DELAY = 0.5  # Seconds, doubled on every retry (with full jitter)
+RETRY_MAX_DELAY = 60  # Seconds, cap for backoff and Retry-After waits
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
 
 def get_parameter(param_name):
+    import boto3
     ssm = boto3.client('ssm')
     response = ssm.get_parameter(Name=param_name, WithDecryption=True)
     return response['Parameter']['Value']
 
-async def load_cache():
+def create_http_session(connection_stats):
+    # Count new connections (each one is a TCP+TLS handshake) vs. reused keep-alive connections
+    async def on_connection_create_end(session, trace_config_ctx, params):
+        connection_stats['handshakes'] += 1
+
+    async def on_connection_reuseconn(session, trace_config_ctx, params):
+        connection_stats['reused'] += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+class AdaptiveRateLimiter:
+    # Token bucket whose rate follows AIMD: it grows slowly while requests succeed and is
+    # halved when the host throttles us, so we settle at the highest rate the API allows.
+    # Until a host first throttles, a slow start doubles the rate every second's worth of
+    # successful requests, so a host that never throttles isn't held back by the slow climb.
+    def __init__(self, host):
+        self.host = host
+        self.rate = RATE_LIMIT_INITIAL
+        self.slow_start = True
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # Set from Retry-After, holds back every request to the host
+        self.last_decrease = 0.0
+        self.retries = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                # Burst is capped at one second's worth of requests
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        # Each success is 1 / rate seconds' worth of requests
+        if self.slow_start:
+            self.rate = min(RATE_LIMIT_MAX, self.rate * RATE_LIMIT_SLOW_START ** (1 / self.rate))
+        else:
+            self.rate = min(RATE_LIMIT_MAX, self.rate + RATE_LIMIT_INCREASE / self.rate)
+
+    def on_throttle(self, retry_after):
+        now = time.monotonic()
+        self.slow_start = False
+        # Many in-flight requests get throttled together, only back off once per second
+        if now - self.last_decrease >= 1:
+            self.rate = max(RATE_LIMIT_MIN, self.rate * RATE_LIMIT_DECREASE)
+            self.last_decrease = now
+            logger.warning(f"{self.host} is throttling requests, lowering rate to {self.rate:.1f}/s")
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+rate_limiters = {}
+
+def get_rate_limiter(url):
+    host = urlsplit(url).netloc
+    if host not in rate_limiters:
+        rate_limiters[host] = AdaptiveRateLimiter(host)
+    return rate_limiters[host]
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), RETRY_MAX_DELAY)
+
+def backoff_delay(attempt):
+    # Full jitter: random wait between 0 and the exponential backoff ceiling
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+@asynccontextmanager
+async def http_request(session, method, url, max_retries=MAX_RETRIES, credentials=None, **kwargs):
+    # Every Graph / Photos call goes through here: waits for the host's rate limiter, retries
+    # connection errors and 429/5xx responses (honoring Retry-After) with jittered backoff.
+    # Yields the final response; one that is still failing after max_retries is yielded as is.
+    # With `credentials`, every attempt carries a currently valid bearer token, and a 401 gets
+    # the token refreshed and the request retried once.
+    limiter = get_rate_limiter(url)
+    attempt = 0
+    reauthenticated = False
+    headers = kwargs.pop('headers', None) or {}
+    while True:
+        if credentials is not None:
+            token = await credentials.access_token()
+            kwargs['headers'] = {**headers, 'Authorization': f"Bearer {token}"}
+        else:
+            kwargs['headers'] = headers
+        await limiter.acquire()
+        try:
+            response = await session.request(method, url, **kwargs)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{method} {limiter.host} failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+        else:
+            if response.status == 401 and credentials is not None and not reauthenticated:
+                # Revoked or expired early, the first caller to notice forces a refresh
+                response.release()
+                credentials.invalidate(token)
+                reauthenticated = True
+                logger.warning(f"{method} {limiter.host} rejected the access token, refreshing it")
+                continue
+            if response.status not in RETRYABLE_STATUSES or attempt >= max_retries:
+                if response.status < 400:
+                    limiter.on_success()
+                try:
+                    yield response
+                finally:
+                    response.release()
+                return
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            response.release()
+            if response.status in (429, 503):
+                limiter.on_throttle(retry_after)
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            logger.warning(f"{method} {limiter.host} returned {response.status}, retrying in {delay:.1f}s")
+
+        attempt += 1
+        limiter.retries += 1
+        await asyncio.sleep(delay)
+
+def log_rate_limiter_stats():
+    for limiter in rate_limiters.values():
+        logger.info(f"Rate limiter {limiter.host}: settled at {limiter.rate:.1f} req/s, {limiter.retries} retries")
+
+def log_connection_stats(connection_stats):
+    total = connection_stats['handshakes'] + connection_stats['reused']
+    reuse_ratio = connection_stats['reused'] / total if total else 0
+    logger.info(f"HTTP connections: {connection_stats['handshakes']} handshakes, "
+                f"{connection_stats['reused']} reused ({reuse_ratio:.0%} reuse)")
+
+async def load_cache(path=None):
+    from msal import SerializableTokenCache
+    path = path or TOKEN_FILE_ONEDRIVE
     logger.info("Loading OneDrive token cache")
     cache = SerializableTokenCache()
-    if os.path.exists(TOKEN_FILE_ONEDRIVE):
-        async with aiofiles.open(TOKEN_FILE_ONEDRIVE, 'r') as token_file:
+    if os.path.exists(path):
+        async with aiofiles.open(path, 'r') as token_file:
             cache.deserialize(await token_file.read())
     return cache
 
-async def save_cache(cache):
-    logger.info("Saving OneDrive token cache")
+async def save_cache(cache, path=None):
     if cache.has_state_changed:
-        async with aiofiles.open(TOKEN_FILE_ONEDRIVE, 'w') as token_file:
-            await token_file.write(cache.serialize())
+        logger.info("Saving OneDrive token cache")
+        await asyncio.to_thread(write_file_atomic, path or TOKEN_FILE_ONEDRIVE, cache.serialize())
+        cache.has_state_changed = False
 
-async def authenticate_onedrive():
-    logger.info("Starting OneDrive authentication")
-    cache = await load_cache()
-    
-    app = PublicClientApplication(
-        client_id=CLIENT_ID_ONEDRIVE,
-        authority=AUTHORITY_ONEDRIVE,
-        token_cache=cache
-    )
+def write_file_atomic(path, text, mode=0o600):
+    # Every state file (tokens, delta links, album cache, metrics) is written to a temp file
+    # first, so a crash never leaves a truncated one behind and a reader never sees half a file.
+    # The temp name is unique, since the workers of a --config run share the token files.
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.",
+                                     suffix='.tmp')
+    try:
+        with open(fd, 'w') as f:
+            f.write(text)
+        os.chmod(temp_file, mode)
+        os.replace(temp_file, path)
+    except BaseException:
+        os.remove(temp_file)
+        raise
 
-    accounts = app.get_accounts()
-    if accounts:
-        logger.info("Found existing OneDrive account, attempting to use it")
-        result = app.acquire_token_silent(SCOPES_ONEDRIVE, account=accounts[0])
-        if result:
-            logger.info("Token acquired silently")
-            await save_cache(cache)
-            return result['access_token']
-        else:
-            logger.info("Silent token acquisition failed, falling back to device flow")
+class CredentialProvider(ABC):
+    # Hands a valid access token to every concurrent caller. Tokens are refreshed
+    # TOKEN_REFRESH_MARGIN seconds before they expire, and only one refresh runs at a time:
+    # callers that turn up during a refresh wait for its token instead of starting their own.
+    # Subclasses implement refresh(), which sets self.token and self.expires_at.
+    def __init__(self):
+        self.token = None
+        self.expires_at = 0.0  # time.time() at which the token stops working
+        self.lock = asyncio.Lock()
 
-    flow = app.initiate_device_flow(scopes=SCOPES_ONEDRIVE)
-    if "user_code" not in flow:
-        logger.error("Failed to create device flow")
-        raise Exception("Failed to create device flow")
+    def needs_refresh(self):
+        return self.token is None or time.time() >= self.expires_at - TOKEN_REFRESH_MARGIN
 
-    print(f"To authenticate, please follow these steps:")
-    print(f"1. Open this URL in your web browser: {flow['verification_uri']}")
-    print(f"2. Enter this code when prompted: {flow['user_code']}")
+    async def access_token(self):
+        if self.needs_refresh():
+            async with self.lock:
+                if self.needs_refresh():  # Not refreshed by whoever held the lock before us
+                    await self.refresh()
+        return self.token
 
-    result = await asyncio.to_thread(app.acquire_token_by_device_flow, flow)
+    def invalidate(self, token):
+        # A 401 with `token`: make the next caller refresh, unless someone already replaced it
+        if token == self.token:
+            self.expires_at = 0.0
 
-    if "access_token" in result:
-        logger.info("Authentication successful")
-        await save_cache(cache)
-        return result['access_token']
-    else:
-        logger.error(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
-        raise Exception(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
+    @abstractmethod
+    async def refresh(self):
+        pass
+
+class OneDriveCredentials(CredentialProvider):
+    # MSAL public client on the persisted token cache. Refreshes silently from the cached
+    # refresh token, the device flow only runs when there is no usable account in the cache.
+    def __init__(self, token_file=None):
+        super().__init__()
+        self.token_file = token_file or TOKEN_FILE_ONEDRIVE
+        self.cache = None
+        self.app = None
+
+    async def refresh(self):
+        from msal import PublicClientApplication
+        if self.app is None:
+            self.cache = await load_cache(self.token_file)
+            self.app = PublicClientApplication(
+                client_id=CLIENT_ID_ONEDRIVE,
+                authority=AUTHORITY_ONEDRIVE,
+                token_cache=self.cache
+            )
+
+        result = None
+        accounts = self.app.get_accounts()
+        if accounts:
+            logger.info("Found existing OneDrive account, attempting to use it")
+            # Once we've handed a token out, MSAL's cached one is the one being replaced
+            result = await asyncio.to_thread(self.app.acquire_token_silent, SCOPES_ONEDRIVE,
+                                             account=accounts[0], force_refresh=self.token is not None)
+            if result and 'access_token' in result:
+                logger.info("Token acquired silently")
+            else:
+                logger.info("Silent token acquisition failed, falling back to device flow")
+                result = None
+        if result is None:
+            result = await self.device_flow()
+
+        self.token = result['access_token']
+        self.expires_at = time.time() + int(result.get('expires_in', 3600))
+        await save_cache(self.cache, self.token_file)
+
+    async def device_flow(self):
+        flow = self.app.initiate_device_flow(scopes=SCOPES_ONEDRIVE)
+        if "user_code" not in flow:
+            logger.error("Failed to create device flow")
+            raise Exception("Failed to create device flow")
+
+        print(f"To authenticate, please follow these steps:")
+        print(f"1. Open this URL in your web browser: {flow['verification_uri']}")
+        print(f"2. Enter this code when prompted: {flow['user_code']}")
+
+        result = await asyncio.to_thread(self.app.acquire_token_by_device_flow, flow)
+
+        if "access_token" in result:
+            logger.info("Authentication successful")
+            return result
+        else:
+            logger.error(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
+            raise Exception(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
 
-async def list_files_from_onedrive(folder_path, onedrive_token):
+async def authenticate_onedrive(token_file=None):
+    # Signs in up front (device flow if needed) rather than in the middle of a sync
+    logger.info("Starting OneDrive authentication")
+    credentials = OneDriveCredentials(token_file)
+    await credentials.access_token()
+    return credentials
+
+async def iter_files_from_onedrive(session, folder_path, onedrive_credentials, metrics=None):
     logger.info(f"Listing files from OneDrive folder: {folder_path}")
     endpoint = f"{ONEDRIVE_API_ENDPOINT}/drive/root:/{folder_path}:/children"
-    headers = {
-        "Authorization": f"Bearer {onedrive_token}",
-        "Accept": "application/json"
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(endpoint, headers=headers) as response:
-            if response.status == 200:
-                data = await response.json()
-                files = data.get('value', [])
-                logger.info(f"Found {len(files)} files in OneDrive folder")
-                return files
-            elif response.status == 404:
+    headers = {"Accept": "application/json"}
+
+    page = 0
+    while endpoint:
+        started = time.perf_counter()
+        async with http_request(session, 'GET', endpoint, headers=headers,
+                                credentials=onedrive_credentials) as response:
+            if response.status == 404:
                 logger.warning(f"Folder '{folder_path}' not found. Please check the path.")
-                return []
-            else:
+                return
+            elif response.status != 200:
                 text = await response.text()
                 logger.error(f"Failed to list files. Status code: {response.status}")
                 logger.error(f"Response: {text}")
                 raise Exception(f"Failed to list files: {response.status} - {text}")
+            data = await response.json()
+        if metrics:
+            metrics.observe('list', time.perf_counter() - started)
 
-async def authenticate_google_photos():
-    logger.info("Starting Google Photos authentication")
-    creds = None
+        page += 1
+        files = data.get('value', [])
+        logger.info(f"Found {len(files)} files on page {page} of OneDrive folder")
+        for file in files:
+            yield file
+        endpoint = data.get('@odata.nextLink')
 
-    if os.path.exists(TOKEN_PICKLE_GOOGLE):
-        logger.info(f"Loading credentials from {TOKEN_PICKLE_GOOGLE}")
-        creds = Credentials.from_authorized_user_file(TOKEN_PICKLE_GOOGLE, SCOPES_GOOGLE)
+def load_delta_link(folder_path):
+    if not os.path.exists(DELTA_TOKEN_FILE):
+        return None
+    with open(DELTA_TOKEN_FILE, 'r') as delta_file:
+        return json.load(delta_file).get(folder_path)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            logger.info("Refreshing expired credentials")
-            await asyncio.to_thread(creds.refresh, Request())
+def save_delta_link(folder_path, delta_link):
+    delta_links = {}
+    if os.path.exists(DELTA_TOKEN_FILE):
+        with open(DELTA_TOKEN_FILE, 'r') as delta_file:
+            delta_links = json.load(delta_file)
+    delta_links[folder_path] = delta_link
+    write_file_atomic(DELTA_TOKEN_FILE, json.dumps(delta_links))
+    logger.info(f"Saved OneDrive delta token for folder: {folder_path}")
+
+async def iter_delta_from_onedrive(session, folder_path, onedrive_credentials, delta_state, metrics=None):
+    # Yields files added or changed since the last saved delta link. The new delta link is
+    # stored in delta_state['delta_link'] once every page has been read; the caller persists it.
+    full_sync_endpoint = f"{ONEDRIVE_API_ENDPOINT}/drive/root:/{folder_path}:/delta"
+    endpoint = load_delta_link(folder_path)
+    if endpoint:
+        logger.info(f"Listing changes in OneDrive folder since last sync: {folder_path}")
+    else:
+        logger.info(f"No delta token found, enumerating whole OneDrive folder: {folder_path}")
+        endpoint = full_sync_endpoint
+    headers = {"Accept": "application/json"}
+
+    while endpoint:
+        started = time.perf_counter()
+        async with http_request(session, 'GET', endpoint, headers=headers,
+                                credentials=onedrive_credentials) as response:
+            if response.status == 410:
+                # The delta token expired, Graph asks for a full resync
+                logger.warning("OneDrive delta token expired, restarting full enumeration")
+                endpoint = full_sync_endpoint
+                continue
+            elif response.status == 404:
+                logger.warning(f"Folder '{folder_path}' not found. Please check the path.")
+                return
+            elif response.status != 200:
+                text = await response.text()
+                logger.error(f"Failed to list changes. Status code: {response.status}")
+                logger.error(f"Response: {text}")
+                raise Exception(f"Failed to list changes: {response.status} - {text}")
+            data = await response.json()
+        if metrics:
+            metrics.observe('list', time.perf_counter() - started)
+
+        for item in data.get('value', []):
+            # Delta also reports folders and removed items, only new/changed files are synced
+            if 'file' in item and 'deleted' not in item:
+                yield item
+        endpoint = data.get('@odata.nextLink')
+        if not endpoint:
+            delta_state['delta_link'] = data.get('@odata.deltaLink')
+
+class GoogleCredentials(CredentialProvider):
+    # google-auth user credentials, refreshed in a worker thread (the library is blocking) and
+    # written back to the token file after every refresh
+    def __init__(self, token_file=None):
+        super().__init__()
+        self.token_file = token_file or TOKEN_PICKLE_GOOGLE
+        self.creds = None
+
+    async def refresh(self):
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        if self.creds is None and os.path.exists(self.token_file):
+            logger.info(f"Loading credentials from {self.token_file}")
+            self.creds = Credentials.from_authorized_user_file(self.token_file, SCOPES_GOOGLE)
+
+        if self.creds and self.creds.valid and self.token is None:
+            pass  # Loaded from the token file and still good
+        elif self.creds and self.creds.refresh_token:
+            logger.info("Refreshing Google credentials")
+            await asyncio.to_thread(self.creds.refresh, Request())
         else:
             logger.info("Starting new OAuth flow")
             flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE_GOOGLE, SCOPES_GOOGLE)
-            creds = await asyncio.to_thread(flow.run_local_server, port=0)
-        
-        logger.info(f"Saving credentials to {TOKEN_PICKLE_GOOGLE}")
-        async with aiofiles.open(TOKEN_PICKLE_GOOGLE, 'w') as token:
-            await token.write(creds.to_json())
+            self.creds = await asyncio.to_thread(flow.run_local_server, port=0)
+
+        if self.creds.token != self.token:
+            logger.info(f"Saving credentials to {self.token_file}")
+            await asyncio.to_thread(write_file_atomic, self.token_file, self.creds.to_json())
+        self.token = self.creds.token
+        # google-auth keeps expiry as a naive UTC datetime
+        expiry = self.creds.expiry
+        self.expires_at = expiry.replace(tzinfo=timezone.utc).timestamp() if expiry else math.inf
+
+async def authenticate_google_photos(token_file=None):
+    logger.info("Starting Google Photos authentication")
+    credentials = GoogleCredentials(token_file)
+    await credentials.access_token()
+    return credentials
+
+class PhotosLibraryClient:
+    # Async Photos Library REST client on the shared aiohttp session and rate limiter
+    def __init__(self, session, credentials):
+        self.session = session
+        self.credentials = credentials
+
+    async def _call(self, method, path, body=None, params=None, max_retries=MAX_RETRIES):
+        url = f"{PHOTOS_API_ENDPOINT}/{path}"
+        async with http_request(self.session, method, url, max_retries=max_retries, json=body, params=params,
+                                credentials=self.credentials) as response:
+            # batchCreate answers 207 Multi-Status when only some items were created, the
+            # per-item results are in newMediaItemResults either way
+            if not 200 <= response.status < 300:
+                text = await response.text()
+                raise Exception(f"Photos Library {method} {path} failed: {response.status} - {text}")
+            return await response.json()
+
+    async def list_albums(self):
+        params = {'pageSize': 50, 'excludeNonAppCreatedData': 'true'}
+        while True:
+            response = await self._call('GET', 'albums', params=params)
+            for album in response.get('albums', []):
+                yield album
+            if not response.get('nextPageToken'):
+                return
+            params['pageToken'] = response['nextPageToken']
+
+    async def get_album(self, album_id):
+        return await self._call('GET', f"albums/{album_id}")
+
+    async def create_album(self, title):
+        # Not retried: a request that timed out or got a 5xx may still have created the album,
+        # and a retry would create a second one. find_or_create_album looks again instead.
+        return await self._call('POST', 'albums', body={'album': {'title': title}}, max_retries=0)
+
+    async def share_album(self, album_id, shared_album_options):
+        return await self._call('POST', f"albums/{album_id}:share",
+                                body={'sharedAlbumOptions': shared_album_options})
 
-    return creds
+    async def search_album_media_items(self, album_id):
+        body = {'albumId': album_id, 'pageSize': 100}
+        while True:
+            response = await self._call('POST', 'mediaItems:search', body=body)
+            for media_item in response.get('mediaItems', []):
+                yield media_item
+            if not response.get('nextPageToken'):
+                return
+            body['pageToken'] = response['nextPageToken']
+
+    async def batch_create(self, album_id, new_media_items):
+        return await self._call('POST', 'mediaItems:batchCreate',
+                                body={'newMediaItems': new_media_items, 'albumId': album_id})
+
+    async def upload(self, image_data):
+        if len(image_data) >= RESUMABLE_UPLOAD_THRESHOLD:
+            return await self.upload_resumable(image_data)
+        logger.debug("Uploading single file to Google Photos")
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'X-Goog-Upload-Protocol': 'raw',
+        }
+        async with http_request(self.session, 'POST', f"{PHOTOS_API_ENDPOINT}/uploads", data=image_data,
+                                headers=headers, credentials=self.credentials) as upload_response:
+            if upload_response.status != 200:
+                logger.error(f"Failed to upload image data: {await upload_response.text()}")
+                return None
+            logger.debug("File uploaded successfully")
+            return await upload_response.text()  # The upload token
+
+    async def upload_resumable(self, image_data):
+        size = len(image_data)
+        logger.debug(f"Uploading single file to Google Photos in chunks ({size} bytes)")
+        headers = {
+            'Content-Length': '0',
+            'X-Goog-Upload-Command': 'start',
+            'X-Goog-Upload-Content-Type': 'image/jpeg',
+            'X-Goog-Upload-Protocol': 'resumable',
+            'X-Goog-Upload-Raw-Size': str(size),
+        }
+        async with http_request(self.session, 'POST', f"{PHOTOS_API_ENDPOINT}/uploads", headers=headers,
+                                credentials=self.credentials) as response:
+            if response.status != 200 or 'X-Goog-Upload-URL' not in response.headers:
+                logger.error(f"Failed to start resumable upload: {response.status} - {await response.text()}")
+                return None
+            upload_url = response.headers['X-Goog-Upload-URL']
+            granularity = int(response.headers.get('X-Goog-Upload-Chunk-Granularity', 1))
+        chunk_size = max(granularity, UPLOAD_CHUNK_SIZE // granularity * granularity)
+
+        # Chunks are slices of one memoryview, so nothing is copied before it hits the socket
+        view = memoryview(image_data)
+        offset = 0
+        failures = 0
+        while True:
+            end = min(offset + chunk_size, size)
+            headers = {
+                'X-Goog-Upload-Command': 'upload, finalize' if end == size else 'upload',
+                'X-Goog-Upload-Offset': str(offset),
+            }
+            retry_after = None
+            try:
+                # Not retried blindly: after a failure the server may hold part of the chunk
+                async with http_request(self.session, 'POST', upload_url, max_retries=0, data=view[offset:end],
+                                        headers=headers, credentials=self.credentials) as response:
+                    if response.status == 200:
+                        if end == size:
+                            logger.debug("File uploaded successfully")
+                            return await response.text()  # The upload token
+                        offset = end
+                        failures = 0
+                        continue
+                    error = f"{response.status} - {await response.text()}"
+                    if response.status not in RETRYABLE_STATUSES:
+                        logger.error(f"Resumable upload failed at byte {offset}: {error}")
+                        return None
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+
+            failures += 1
+            if failures > MAX_RETRIES:
+                logger.error(f"Giving up on resumable upload at byte {offset}: {error}")
+                return None
+            await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(failures - 1))
+            committed = await self.query_upload_offset(upload_url)
+            if committed is None:
+                return None
+            if committed > offset:
+                failures = 0  # Only failures that make no progress at all count towards giving up
+            offset = committed
+            logger.warning(f"Resumable upload interrupted ({error}), resuming at byte {offset} of {size}")
 
-async def find_or_create_album(service, album_title):
+    async def query_upload_offset(self, upload_url):
+        headers = {'Content-Length': '0', 'X-Goog-Upload-Command': 'query'}
+        async with http_request(self.session, 'POST', upload_url, headers=headers,
+                                credentials=self.credentials) as response:
+            upload_status = response.headers.get('X-Goog-Upload-Status')
+            if response.status != 200 or upload_status != 'active':
+                logger.error(f"Resumable upload can't be resumed: {response.status}, status {upload_status}")
+                return None
+            return int(response.headers['X-Goog-Upload-Size-Received'])
+
+def load_album_cache():
+    if not os.path.exists(ALBUM_CACHE_FILE):
+        return {}
+    with open(ALBUM_CACHE_FILE, 'r') as album_file:
+        return json.load(album_file)
+
+def save_album_cache(album_title, album_id):
+    albums = load_album_cache()
+    albums[album_title] = album_id
+    write_file_atomic(ALBUM_CACHE_FILE, json.dumps(albums))
+
+async def get_album_id(photos, album_title):
+    # A cached album id is checked with a single albums.get instead of paging through every album
+    album_id = load_album_cache().get(album_title)
+    if album_id:
+        try:
+            album = await photos.get_album(album_id)
+            if album.get('title') == album_title:
+                logger.info(f"Using cached album id for: {album_title}")
+                return album_id
+            logger.info(f"Cached album {album_id} was renamed to '{album.get('title')}', looking up again")
+        except Exception as e:
+            logger.warning(f"Cached album id for '{album_title}' is no longer valid: {str(e)}")
+
+    album_id = await find_or_create_album(photos, album_title)
+    if album_id:
+        save_album_cache(album_title, album_id)
+    return album_id
+
+async def find_or_create_album(photos, album_title):
     logger.info(f"Finding or creating album: {album_title}")
     try:
-        request = service.albums().list(pageSize=50, excludeNonAppCreatedData=True)
-        while request is not None:
-            response = await asyncio.to_thread(request.execute)
-            albums = response.get('albums', [])
-            for album in albums:
+        for attempt in range(MAX_RETRIES + 1):
+            async for album in photos.list_albums():
                 if album['title'] == album_title:
                     logger.info(f"Found existing album: {album_title}")
                     return album['id']
-            request = service.albums().list_next(request, response)
 
-        logger.info(f"Album not found, creating new album: {album_title}")
-        create_album_body = {'album': {'title': album_title}}
-        create_album_response = await asyncio.to_thread(service.albums().create(body=create_album_body).execute)
+            logger.info(f"Album not found, creating new album: {album_title}")
+            try:
+                create_album_response = await photos.create_album(album_title)
+                break
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                # The failed request may still have created the album, so list again before retrying
+                logger.warning(f"Creating album failed, looking it up again before retrying: {str(e)}")
+                await asyncio.sleep(backoff_delay(attempt))
         album_id = create_album_response.get('id')
 
         logger.info(f"Sharing album: {album_title}")
-        share_album_body = {
-            'sharedAlbumOptions': {
-                'isCollaborative': 'true',
-                'isCommentable': 'true'
-            }
-        }
-        await asyncio.to_thread(service.albums().share(albumId=album_id, body=share_album_body).execute)
+        await photos.share_album(album_id, {
+            'isCollaborative': True,
+            'isCommentable': True
+        })
         
         logger.info(f"Created and shared new album: {album_title}")
         return album_id
@@ -206,271 +731,1178 @@ async def find_or_create_album(service, album_title):
         logger.error(f"Error finding or creating album: {str(e)}")
         return None
 
-async def resize_image(file_path):
-    logger.info(f"Resizing image: {file_path}")
-    with Image.open(file_path) as img:
-        original_size = img.size
-        if img.width * img.height > MAX_DIMENSION:
-            aspect_ratio = img.width / img.height
-            new_height = int((MAX_DIMENSION / aspect_ratio) ** 0.5)
-            new_width = int(aspect_ratio * new_height)
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-            logger.info(f"Resized image from {original_size} to {img.size}")
+def resize_target(width, height):
+    if width * height <= MAX_DIMENSION:
+        return None
+    aspect_ratio = width / height
+    new_height = int((MAX_DIMENSION / aspect_ratio) ** 0.5)
+    new_width = int(aspect_ratio * new_height)
+    return new_width, new_height
+
+def open_image(source):
+    from PIL import Image
+    # Pillow refuses images past ~179MP as decompression bombs, which rejects real panoramas.
+    # These are the user's own files and ImageMemoryBudget already bounds the decoded size.
+    Image.MAX_IMAGE_PIXELS = None
+    return Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+def draft_for_resize(img):
+    # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale (never below the target size), so
+    # a huge photo is never held in memory at full resolution. Only reads the header.
+    target = resize_target(*img.size)
+    if target and img.format == 'JPEG':
+        img.draft('RGB', target)
+    return target
+
+def estimate_image_memory(source):
+    # Header only: bytes the image worker will hold for the decoded image and its resized copy
+    with open_image(source) as img:
+        target = draft_for_resize(img)
+        decoded = img.width * img.height * len(img.getbands())
+    output_width, output_height = target or img.size
+    return decoded + output_width * output_height * 3
+
+def resize_in_bands(img, size):
+    # Lanczos-resamples RESIZE_BAND_ROWS output rows at a time, each from its own strip of source
+    # rows (plus the filter's support above and below), so the resize buffers and any RGB
+    # conversion hold one strip instead of full-frame copies. reducing_gap box-reduces first.
+    from PIL import Image
+    output = Image.new('RGB', size)
+    scale = img.height / size[1]
+    margin = math.ceil(3 * scale) + 1  # Lanczos support is 3 output pixels each way
+    for top in range(0, size[1], RESIZE_BAND_ROWS):
+        bottom = min(top + RESIZE_BAND_ROWS, size[1])
+        if img.mode == 'RGB':
+            # resize() only reads the rows under the box, no need to copy them out first
+            strip, strip_top = img, 0
         else:
-            logger.info(f"Image size {original_size} is within limits, no resize needed")
-        
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-            logger.info(f"Converted image to RGB mode")
-        
+            strip_top = max(0, math.floor(top * scale) - margin)
+            strip_bottom = min(img.height, math.ceil(bottom * scale) + margin)
+            strip = img.crop((0, strip_top, img.width, strip_bottom)).convert('RGB')
+        box = (0, top * scale - strip_top, img.width, bottom * scale - strip_top)
+        band = strip.resize((size[0], bottom - top), Image.LANCZOS, box=box, reducing_gap=RESIZE_REDUCING_GAP)
+        output.paste(band, (0, top))
+    return output
+
+def transform_image(source, creation_time, timings=None):
+    # Runs in an IMAGE_WORKERS process: decodes once, resizes if needed and encodes a single
+    # JPEG with DateTimeOriginal embedded. Takes the image bytes (or the path of a download
+    # spilled to disk) and returns the JPEG bytes. Seconds per phase go into `timings`.
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    if isinstance(source, str):
+        logger.debug(f"Transforming image from {source}")
+    else:
+        logger.debug(f"Transforming image of {len(source)} bytes")
+    original = open_image(source)
+    try:
+        original_size = original.size
+        target = draft_for_resize(original)
+        original.load()
+        timings['decode'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            exif_bytes = build_exif_with_creation_time(original.info.get('exif'), creation_time)
+        except Exception as e:
+            logger.error(f"Error adding creation time to image EXIF: {str(e)}")
+            exif_bytes = None
+        timings['exif'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if target and original.size != target:
+            img = resize_in_bands(original, target)
+            logger.debug(f"Resized image from {original_size} to {img.size} (decoded at {original.size})")
+        elif target:
+            img = original if original.mode == 'RGB' else original.convert('RGB')
+            logger.debug(f"Decoded image from {original_size} straight at {img.size}")
+        else:
+            logger.debug(f"Image size {original_size} is within limits, no resize needed")
+            img = original
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+                logger.debug(f"Converted image to RGB mode")
+        if img is not original:
+            original.close()  # Free the full-size frame before encoding
+        timings['resize'] = time.perf_counter() - started
+
+        started = time.perf_counter()
         buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
-        buffer.seek(0)
-        logger.info(f"Image processed and converted to JPEG with quality {JPEG_QUALITY}")
+        if exif_bytes:
+            img.save(buffer, format='JPEG', quality=JPEG_QUALITY, exif=exif_bytes)
+        else:
+            img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        img.close()
+        timings['encode'] = time.perf_counter() - started
+        logger.debug(f"Image processed and converted to JPEG with quality {JPEG_QUALITY}")
         return buffer.getvalue()
+    finally:
+        original.close()
 
-async def upload_single_file(image_data, creds):
-    logger.info("Uploading single file to Google Photos")
-    upload_url = 'https://photoslibrary.googleapis.com/v1/uploads'
-    headers = {
-        'Authorization': f'Bearer {creds.token}',
-        'Content-Type': 'application/octet-stream',
-        'X-Goog-Upload-Protocol': 'raw',
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(upload_url, data=image_data, headers=headers) as upload_response:
-            if upload_response.status != 200:
-                logger.error(f"Failed to upload image data: {await upload_response.text()}")
-                return None
-            logger.info("File uploaded successfully")
-            return await upload_response.text()  # This now returns a string
-  # Changed from content.read() to text()
+def transform_image_timed(source, creation_time):
+    timings = {}
+    return transform_image(source, creation_time, timings), timings
 
+class ImageMemoryBudget:
+    # Caps the decoded image bytes held across the image workers, so a run of huge panoramas
+    # waits its turn instead of decoding side by side. An image over the whole budget still
+    # runs, but only once nothing else is held.
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.condition = asyncio.Condition()
 
-async def upload_to_google_photos(files_to_upload, album_id, creds):
-    logger.info(f"Starting upload process for {len(files_to_upload)} files")
-    service = build('photoslibrary', 'v1', credentials=creds, static_discovery=False)
-    
-    if not album_id:
-        logger.info("Album ID not provided, finding or creating album")
-        album_id = await find_or_create_album(service, ALBUM_TITLE)
-
-    for i in range(0, len(files_to_upload), MAX_BATCH_SIZE):
-        batch = files_to_upload[i:i+MAX_BATCH_SIZE]
-        logger.info(f"Processing batch {i//MAX_BATCH_SIZE + 1} with {len(batch)} files")
-        upload_tokens = []
+    @asynccontextmanager
+    async def reserve(self, size):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_use == 0 or self.in_use + size <= self.limit)
+            self.in_use += size
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.in_use -= size
+                self.condition.notify_all()
 
-        for file_path in batch:
-            try:
-                logger.info(f"Resizing and uploading file: {file_path}")
-                image_data = await resize_image(file_path)
-                upload_token = await upload_single_file(image_data, creds)
-                if upload_token:
-                    upload_tokens.append((file_path, upload_token))
-                    logger.info(f"Successfully uploaded file: {file_path}")
-                else:
-                    logger.warning(f"Failed to get upload token for file: {file_path}")
-            except Exception as e:
-                logger.error(f"Error uploading {os.path.basename(file_path)}: {str(e)}")
+async def process_image(image_pool, source, creation_time, metrics=None, memory_budget=None):
+    # Decoding, resampling and JPEG encoding are CPU bound, keep them off the event loop
+    loop = asyncio.get_running_loop()
+    if memory_budget is None:
+        image_data, timings = await loop.run_in_executor(image_pool, transform_image_timed, source, creation_time)
+    else:
+        # Header parsing is quick but still file I/O and PIL work, keep it off the event loop too
+        async with memory_budget.reserve(await asyncio.to_thread(estimate_image_memory, source)):
+            image_data, timings = await loop.run_in_executor(image_pool, transform_image_timed, source, creation_time)
+    if metrics:
+        for phase, seconds in timings.items():
+            metrics.observe(phase, seconds)
+    return image_data
 
-        if upload_tokens:
-            try:
-                logger.info(f"Creating media items for {len(upload_tokens)} files")
-                new_media_items = []
-                for file_path, token in upload_tokens:
-                    original_filename = os.path.splitext(os.path.basename(file_path))[0]
-                    new_media_items.append({
-                        'simpleMediaItem': {
-                            'uploadToken': token,
-                            'fileName': original_filename
-                        }
-                    })
-
-                request_body = {
-                    'newMediaItems': new_media_items,
-                    'albumId': album_id
-                }
-
-                create_response = await asyncio.to_thread(
-                    service.mediaItems().batchCreate(body=request_body).execute
-                )
-
-                for (file_path, _), result in zip(upload_tokens, create_response.get('newMediaItemResults', [])):
-                    if 'mediaItem' in result:
-                        google_photos_filename = result['mediaItem']['filename']
-                        logger.info(f"Successfully created media item: {google_photos_filename}")
-                        yield file_path, True
-                    else:
-                        logger.warning(f"Failed to create media item for {os.path.basename(file_path)}: {result.get('status', {}).get('message', 'Unknown error')}")
-                        yield file_path, False
+async def create_media_items(photos, album_id, items):
+    logger.debug(f"Creating media items for {len(items)} files")
+    new_media_items = []
+    for item in items:
+        original_filename = os.path.splitext(item['file']['name'])[0]
+        new_media_items.append({
+            'simpleMediaItem': {
+                'uploadToken': item['upload_token'],
+                'fileName': original_filename
+            }
+        })
 
-            except Exception as e:
-                logger.error(f"Error in batch create: {str(e)}")
-                for file_path, _ in upload_tokens:
-                    yield file_path, False
+    try:
+        create_response = await photos.batch_create(album_id, new_media_items)
+    except Exception as e:
+        logger.error(f"Error in batch create: {str(e)}")
+        return [(item, False) for item in items]
 
-        logger.info(f"Waiting {UPLOAD_DELAY} seconds before processing next batch")
-        await asyncio.sleep(UPLOAD_DELAY)
+    results = create_response.get('newMediaItemResults', [])
+    created = []
+    for index, item in enumerate(items):
+        result = results[index] if index < len(results) else {}
+        if 'mediaItem' in result:
+            google_photos_filename = result['mediaItem']['filename']
+            logger.debug(f"Successfully created media item: {google_photos_filename}")
+            item['media_item_id'] = result['mediaItem'].get('id')
+            created.append((item, True))
+        else:
+            logger.warning(f"Failed to create media item for {item['file']['name']}: {result.get('status', {}).get('message', 'Unknown error')}")
+            created.append((item, False))
+    return created
 
 
 def get_file_creation_time(file_path):
     try:
         stat = os.stat(file_path)
-        creation_time = datetime.fromtimestamp(stat.st_ctime, tz=pytz.UTC)
+        creation_time = datetime.fromtimestamp(stat.st_ctime, tz=timezone.utc)
         return creation_time.strftime("%Y-%m-%dT%H:%M:%SZ")  # RFC3339 UTC "Zulu" format
     except Exception as e:
         logger.error(f"Error getting creation time for {file_path}: {str(e)}")
         return None
 
 
-async def delete_file_from_onedrive(file, access_token):
-    logger.info(f"Deleting file from OneDrive: {file['name']}")
-    headers = {"Authorization": f"Bearer {access_token}"}
-    delete_url = f"{ONEDRIVE_API_ENDPOINT}/drive/items/{file['id']}"
-    async with aiohttp.ClientSession() as session:
-        async with session.delete(delete_url, headers=headers) as response:
-            if response.status == 204:
-                logger.info(f"Successfully deleted {file['name']} from OneDrive")
-            else:
-                logger.error(f"Failed to delete {file['name']} from OneDrive: {response.status} - {await response.text()}")
+async def delete_files_from_onedrive(session, files, onedrive_credentials):
+    # Deletes through Graph JSON batching, GRAPH_BATCH_SIZE files per round trip. Throttled or
+    # failing sub-requests are retried in a later round. Returns {item id: deleted}
+    version_root, _, drive_owner = ONEDRIVE_API_ENDPOINT.rpartition('/')
+    batch_url = f"{version_root}/$batch"
+    deleted = {}
+    pending = list(files)
+    for attempt in range(MAX_RETRIES + 1):
+        retry = []
+        retry_after = None
+        for start in range(0, len(pending), GRAPH_BATCH_SIZE):
+            chunk = pending[start:start + GRAPH_BATCH_SIZE]
+            logger.debug(f"Deleting {len(chunk)} files from OneDrive")
+            body = {'requests': [
+                {'id': str(i), 'method': 'DELETE', 'url': f"/{drive_owner}/drive/items/{file['id']}"}
+                for i, file in enumerate(chunk)
+            ]}
+            async with http_request(session, 'POST', batch_url, json=body,
+                                    credentials=onedrive_credentials) as response:
+                if response.status != 200:
+                    logger.error(f"Failed to delete files from OneDrive: {response.status} - {await response.text()}")
+                    deleted.update((file['id'], False) for file in chunk)
+                    continue
+                responses = {r['id']: r for r in (await response.json()).get('responses', [])}
+
+            for i, file in enumerate(chunk):
+                result = responses.get(str(i), {})
+                status = result.get('status')
+                if status == 204:
+                    logger.debug(f"Successfully deleted {file['name']} from OneDrive")
+                    deleted[file['id']] = True
+                elif status == 404:
+                    # Already gone, e.g. deleted by a run that crashed before journaling it
+                    logger.debug(f"{file['name']} was already deleted from OneDrive")
+                    deleted[file['id']] = True
+                elif status in RETRYABLE_STATUSES or status is None:
+                    retry.append(file)
+                    item_retry_after = parse_retry_after((result.get('headers') or {}).get('Retry-After'))
+                    if item_retry_after is not None:
+                        retry_after = max(retry_after or 0, item_retry_after)
+                else:
+                    logger.error(f"Failed to delete {file['name']} from OneDrive: {status} - {result.get('body')}")
+                    deleted[file['id']] = False
 
-async def download_file(file, onedrive_token):
-    file_download_url = file['@microsoft.graph.downloadUrl']
+        if not retry:
+            break
+        if attempt == MAX_RETRIES:
+            for file in retry:
+                logger.error(f"Failed to delete {file['name']} from OneDrive: still throttled or failing")
+                deleted[file['id']] = False
+            break
+        limiter = get_rate_limiter(batch_url)
+        if retry_after is not None:
+            limiter.on_throttle(retry_after)
+        limiter.retries += 1
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        logger.warning(f"{len(retry)} OneDrive deletes were throttled or failed, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        pending = retry
+    return deleted
+
+async def download_file(session, file, onedrive_credentials):
+    # Streams the file into memory and returns its bytes. Files larger than STREAM_SPILL_THRESHOLD
+    # are spilled to TRANSFERS_FOLDER instead and their path is returned. None on failure.
+    # Delta results don't always carry a pre-authenticated download URL, fall back to /content
+    file_download_url = file.get('@microsoft.graph.downloadUrl')
+    credentials = None
+    if not file_download_url:
+        file_download_url = f"{ONEDRIVE_API_ENDPOINT}/drive/items/{file['id']}/content"
+        credentials = onedrive_credentials
     original_file_name = file['name']
     # sanitized_file_name = sanitize_filename(original_file_name)
     file_path = os.path.join(TRANSFERS_FOLDER, original_file_name)
     
-    logger.info(f"Downloading file from OneDrive: {original_file_name}")
+    logger.debug(f"Downloading file from OneDrive: {original_file_name}")
+    spill_file = None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_download_url) as response:
-                response.raise_for_status()
-                content = await response.read()
-        
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
-
-        # Get creation time from OneDrive metadata
-        creation_time = datetime.strptime(file['createdDateTime'], "%Y-%m-%dT%H:%M:%S.%fZ")
-        logger.info(f"Original createdDateTime of {original_file_name}: {creation_time}")
-        creation_time = creation_time.replace(tzinfo=pytz.UTC)
-        logger.info(f"UTC createdDateTime of {original_file_name}: {creation_time}")
-
-        # Add creation time to metadata
-        await add_creation_time_to_png(file_path, creation_time)
+        async with http_request(session, 'GET', file_download_url, credentials=credentials) as response:
+            response.raise_for_status()
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                if spill_file is None and len(buffer) + len(chunk) > STREAM_SPILL_THRESHOLD:
+                    logger.debug(f"{original_file_name} exceeds {STREAM_SPILL_THRESHOLD} bytes, spilling to {file_path}")
+                    spill_file = await aiofiles.open(file_path, 'wb')
+                    await spill_file.write(buffer)
+                    buffer = None
+                if spill_file is None:
+                    buffer += chunk
+                else:
+                    await spill_file.write(chunk)
 
-        logger.info(f"File downloaded and metadata updated successfully: {os.path.basename(file_path)}")
-        return file_path
+        if spill_file is not None:
+            await spill_file.close()
+            logger.debug(f"File downloaded successfully: {os.path.basename(file_path)}")
+            return file_path
+        logger.debug(f"File downloaded successfully into memory: {original_file_name} ({len(buffer)} bytes)")
+        return buffer
     except Exception as e:
         logger.error(f"Error downloading {original_file_name}: {str(e)}")
+        if spill_file is not None:
+            await spill_file.close()
+            os.remove(file_path)
         return None
 
-async def add_creation_time_to_png(file_path, creation_time):
-    try:
-        # Check if creation_time is already a datetime object
-        if isinstance(creation_time, datetime):
-            creation_time_dt = creation_time
+def get_onedrive_creation_time(file):
+    # Get creation time from OneDrive metadata
+    creation_time = datetime.strptime(file['createdDateTime'], "%Y-%m-%dT%H:%M:%S.%fZ")
+    logger.debug(f"Original createdDateTime of {file['name']}: {creation_time}")
+    creation_time = creation_time.replace(tzinfo=timezone.utc)
+    logger.debug(f"UTC createdDateTime of {file['name']}: {creation_time}")
+    return creation_time
+
+def build_exif_with_creation_time(exif_data, creation_time):
+    import piexif
+    # Format the creation time as required by EXIF
+    exif_time_str = creation_time.strftime("%Y:%m:%d %H:%M:%S")
+
+    if exif_data:
+        # If EXIF exists, load it
+        exif_dict = piexif.load(exif_data)
+    else:
+        # If no EXIF, create a new dictionary
+        exif_dict = {"0th":{}, "Exif":{}}
+
+    # Add or update DateTimeOriginal tag
+    exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = exif_time_str
+    return piexif.dump(exif_dict)
+
+
+class SyncJournal:
+    # Per-file transfer progress, keyed by OneDrive item id + eTag so a modified file is
+    # transferred again. States advance downloaded -> uploaded -> created -> deleted.
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        # WAL keeps each state transition a cheap append that survives a crash mid-run
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS transfers (
+                item_id TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                name TEXT NOT NULL,
+                state TEXT NOT NULL,
+                upload_token TEXT,
+                media_item_id TEXT,
+                updated_at TEXT NOT NULL,
+                content_hashes BLOB,
+                PRIMARY KEY (item_id, etag)
+            )
+        """)
+        columns = {row['name'] for row in self.connection.execute('PRAGMA table_info(transfers)')}
+        if 'content_hashes' not in columns:
+            # Journals written before the hash index keys were kept per file
+            self.connection.execute('ALTER TABLE transfers ADD COLUMN content_hashes BLOB')
+        self.connection.commit()
+
+    def get(self, file):
+        return self.connection.execute(
+            'SELECT * FROM transfers WHERE item_id = ? AND etag = ?',
+            (file['id'], file.get('eTag', ''))
+        ).fetchone()
+
+    def record(self, file, state, upload_token=None, media_item_id=None, content_hashes=None):
+        # content_hashes: the file's ContentHashIndex records, joined, kept so the index can be
+        # rebuilt after the OneDrive copy is gone
+        logger.debug(f"Journal: {file['name']} -> {state}")
+        with self.connection:
+            self.connection.execute("""
+                INSERT INTO transfers (item_id, etag, name, state, upload_token, media_item_id, updated_at,
+                                       content_hashes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (item_id, etag) DO UPDATE SET
+                    state = excluded.state,
+                    upload_token = COALESCE(excluded.upload_token, upload_token),
+                    media_item_id = COALESCE(excluded.media_item_id, media_item_id),
+                    updated_at = excluded.updated_at,
+                    content_hashes = COALESCE(excluded.content_hashes, content_hashes)
+            """, (file['id'], file.get('eTag', ''), file['name'], state, upload_token, media_item_id,
+                  datetime.now(timezone.utc).isoformat(), content_hashes))
+
+    def pending_deletes(self):
+        # Files already in the album whose OneDrive copy wasn't deleted yet
+        return self.connection.execute("SELECT * FROM transfers WHERE state = 'created'").fetchall()
+
+    def created_media_items(self):
+        # Files whose media item was created, with the content hashes recorded at the time
+        return self.connection.execute(
+            'SELECT * FROM transfers WHERE media_item_id IS NOT NULL AND content_hashes IS NOT NULL'
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+class ContentHashIndex:
+    # Hashes of every file already uploaded, so the same content is never transferred twice.
+    # On disk it is an append-only file of fixed-size records: one byte for the Graph hash
+    # type followed by the 20 byte digest. In memory it is a set for O(1) lookups.
+    HASH_TYPES = {'quickXorHash': b'Q', 'sha1Hash': b'S'}
+    RECORD_SIZE = 21
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        if os.path.exists(path):
+            with open(path, 'rb') as index_file:
+                data = index_file.read()
+            usable = len(data) - len(data) % self.RECORD_SIZE
+            self.hashes = {data[i:i + self.RECORD_SIZE] for i in range(0, usable, self.RECORD_SIZE)}
+            if usable != len(data):
+                # Drop a record torn by a crash so later appends stay aligned
+                logger.warning(f"Truncating partial record at the end of {path}")
+                os.truncate(path, usable)
+        self.index_file = open(path, 'ab')
+        logger.info(f"Loaded {len(self.hashes)} content hashes from {path}")
+
+    def keys_for(self, file):
+        keys = []
+        for hash_type, value in file.get('file', {}).get('hashes', {}).items():
+            if hash_type not in self.HASH_TYPES:
+                continue
+            try:
+                digest = base64.b64decode(value) if hash_type == 'quickXorHash' else bytes.fromhex(value)
+            except ValueError:
+                continue
+            if len(digest) == self.RECORD_SIZE - 1:
+                keys.append(self.HASH_TYPES[hash_type] + digest)
+        return keys
+
+    def contains(self, file):
+        return any(key in self.hashes for key in self.keys_for(file))
+
+    def add(self, file):
+        return self.add_keys(self.keys_for(file))
+
+    def add_keys(self, keys):
+        new_keys = [key for key in keys if key not in self.hashes]
+        if new_keys:
+            self.hashes.update(new_keys)
+            self.index_file.write(b''.join(new_keys))
+            self.index_file.flush()
+        return len(new_keys)
+
+    def close(self):
+        self.index_file.close()
+
+def resume_step(journal_entry):
+    # Which pipeline queue a file re-enters at, based on what the journal says is already done
+    if journal_entry is None:
+        return 'download'
+    if journal_entry['state'] == 'deleted':
+        return None
+    if journal_entry['state'] == 'created':
+        return 'delete'
+    if journal_entry['state'] == 'uploaded':
+        uploaded_at = datetime.fromisoformat(journal_entry['updated_at'])
+        if datetime.now(timezone.utc) - uploaded_at < UPLOAD_TOKEN_TTL:
+            return 'batch_create'
+    return 'download'
+
+def next_step(file, journal, hash_index):
+    # What a sync run does with a listed file: the pipeline stage it enters at ('download',
+    # 'batch_create' or 'delete'), 'duplicate', 'sidecar', 'synced', or None for other files.
+    # Shared by the pipeline feeder and --plan. Also returns the file's journal entry.
+    name = file['name'].lower()
+    if name.endswith('.xjr'):
+        return 'sidecar', None
+    if not name.endswith('.png'):
+        return None, None
+    journal_entry = journal.get(file) if journal is not None else None
+    step = resume_step(journal_entry)
+    if step == 'download' and hash_index is not None and hash_index.contains(file):
+        return 'duplicate', journal_entry
+    return step or 'synced', journal_entry
+
+class PipelineMetrics:
+    # Latencies, error counts, byte counters and queue depths of one sync run. Stage timers
+    # record one sample per item, or per request for list pages and batched stages.
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies = defaultdict(list)  # stage -> seconds per sample
+        self.errors = defaultdict(int)  # stage -> items that failed in it
+        self.counters = defaultdict(int)  # e.g. downloaded_bytes, uploaded_bytes, files_succeeded
+        self.queue_depths = defaultdict(list)  # queue -> sampled sizes
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        self.latencies[stage].append(seconds)
+
+    def error(self, stage, count=1):
+        self.errors[stage] += count
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    async def sample_queues(self, queues):
+        while True:
+            for name, queue in queues.items():
+                self.queue_depths[name].append(queue.qsize())
+            await asyncio.sleep(METRICS_SAMPLE_INTERVAL)
+
+    def snapshot(self):
+        stages = {}
+        order = {stage: i for i, stage in enumerate(METRICS_STAGE_ORDER)}
+        for stage in sorted(set(self.latencies) | set(self.errors), key=lambda s: (order.get(s, len(order)), s)):
+            values = sorted(self.latencies.get(stage, []))
+            stages[stage] = {'count': len(values), 'errors': self.errors.get(stage, 0),
+                             'total_seconds': sum(values)}
+            for quantile in self.QUANTILES:
+                # Nearest-rank percentile
+                rank = max(0, math.ceil(quantile * len(values)) - 1)
+                stages[stage][f"p{round(quantile * 100)}_seconds"] = values[rank] if values else 0.0
+        return {
+            'duration_seconds': time.monotonic() - self.started,
+            'stages': stages,
+            'counters': dict(self.counters),
+            'queues': {name: {'max': max(depths), 'mean': sum(depths) / len(depths)}
+                       for name, depths in self.queue_depths.items() if depths},
+            'retries': {limiter.host: limiter.retries for limiter in rate_limiters.values()},
+        }
+
+    def to_prometheus(self, snapshot):
+        lines = ['# TYPE photo_sync_duration_seconds gauge',
+                 f"photo_sync_duration_seconds {snapshot['duration_seconds']:.6f}",
+                 '# TYPE photo_sync_stage_seconds summary']
+        for stage, stats in snapshot['stages'].items():
+            for quantile in self.QUANTILES:
+                value = stats[f"p{round(quantile * 100)}_seconds"]
+                lines.append(f'photo_sync_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'photo_sync_stage_seconds_sum{{stage="{stage}"}} {stats["total_seconds"]:.6f}')
+            lines.append(f'photo_sync_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append('# TYPE photo_sync_stage_errors_total counter')
+        for stage, stats in snapshot['stages'].items():
+            lines.append(f'photo_sync_stage_errors_total{{stage="{stage}"}} {stats["errors"]}')
+        for name, value in snapshot['counters'].items():
+            lines.append(f'# TYPE photo_sync_{name}_total counter')
+            lines.append(f'photo_sync_{name}_total {value}')
+        lines.append('# TYPE photo_sync_queue_depth gauge')
+        for name, depths in snapshot['queues'].items():
+            for stat, value in depths.items():
+                lines.append(f'photo_sync_queue_depth{{queue="{name}",stat="{stat}"}} {value:g}')
+        lines.append('# TYPE photo_sync_http_retries_total counter')
+        for host, retries in snapshot['retries'].items():
+            lines.append(f'photo_sync_http_retries_total{{host="{host}"}} {retries}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        snapshot = self.snapshot()
+        if path.endswith('.prom'):
+            content = self.to_prometheus(snapshot)
         else:
-            # If it's a string, parse it
-            creation_time_dt = datetime.strptime(creation_time, "%Y-%m-%d %H:%M:%S.%f")
-        
-        # Format the creation time as required by EXIF
-        exif_time_str = creation_time_dt.strftime("%Y:%m:%d %H:%M:%S")
-        
-        # Open the image
-        with Image.open(file_path) as img:
-            # Check if EXIF data already exists
-            exif_data = img.info.get('exif', None)
-            
-            if exif_data:
-                # If EXIF exists, load it
-                exif_dict = piexif.load(exif_data)
+            content = json.dumps(snapshot, indent=2)
+        write_file_atomic(path, content, mode=0o644)  # Readable by a metrics scraper running as another user
+        logger.info(f"Saved run metrics to {path}")
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<14}{'count':>8}{'errors':>8}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+        for stage, stats in snapshot['stages'].items():
+            lines.append(f"{stage:<14}{stats['count']:>8}{stats['errors']:>8}{stats['total_seconds']:>10.2f}"
+                         f"{stats['p50_seconds'] * 1000:>10.1f}{stats['p95_seconds'] * 1000:>10.1f}"
+                         f"{stats['p99_seconds'] * 1000:>10.1f}")
+        counters = snapshot['counters']
+        lines.append(f"{counters.get('downloaded_bytes', 0) / 1024 ** 2:.1f} MB downloaded, "
+                     f"{counters.get('uploaded_bytes', 0) / 1024 ** 2:.1f} MB uploaded in "
+                     f"{snapshot['duration_seconds']:.1f}s")
+        if snapshot['queues']:
+            lines.append('Queue depth (max/mean): ' + ', '.join(
+                f"{name} {depths['max']}/{depths['mean']:.1f}" for name, depths in snapshot['queues'].items()))
+        if snapshot['retries']:
+            lines.append('HTTP retries: ' + ', '.join(f"{host} {n}" for host, n in snapshot['retries'].items()))
+        logger.info("Sync metrics:\n" + '\n'.join(lines))
+
+def remove_local_file(item):
+    file_path = item.get('path')
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+        logger.debug(f"Removed local file: {file_path}")
+
+async def cancel_and_wait(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def next_pipeline_batch(in_queue, batch_size, linger):
+    # Wait for the first item, then give the batch up to `linger` seconds to fill up
+    item = await in_queue.get()
+    if item is PIPELINE_DONE:
+        return [], True
+
+    batch = [item]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + linger
+    while len(batch) < batch_size:
+        # Not asyncio.wait_for(), it can swallow a cancellation that races with the get completing
+        getter = asyncio.ensure_future(in_queue.get())
+        try:
+            done, _ = await asyncio.wait([getter], timeout=max(0, deadline - loop.time()))
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if not done:
+            break
+        item = getter.result()
+        if item is PIPELINE_DONE:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+async def run_pipeline_stage(name, worker, in_queue, out_queue, concurrency, on_failure, metrics,
+                             batch_size=None, linger=BATCH_CREATE_LINGER):
+    # A worker returns the item to pass downstream, or None if the file failed in this stage.
+    # Batched workers (batch_size set) take a list of items and return (item, success) pairs.
+    async def consume():
+        while True:
+            if batch_size:
+                batch, done = await next_pipeline_batch(in_queue, batch_size, linger)
             else:
-                # If no EXIF, create a new dictionary
-                exif_dict = {"0th":{}, "Exif":{}}
-            
-            # Add or update DateTimeOriginal tag
-            exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = exif_time_str
-            
-            # Convert EXIF dict to bytes
-            exif_bytes = piexif.dump(exif_dict)
-            
-            # Save the image with the new EXIF data
-            img.save(file_path, "PNG", exif=exif_bytes)
-
-        logger.info(f"Creation time added/updated for PNG: {os.path.basename(file_path)}")
-    except Exception as e:
-        logger.error(f"Error adding creation time to PNG {os.path.basename(file_path)}: {str(e)}")
+                item = await in_queue.get()
+                batch, done = ([], True) if item is PIPELINE_DONE else ([item], False)
 
+            if batch:
+                with metrics.timer(name):
+                    try:
+                        if batch_size:
+                            results = await worker(batch)
+                        else:
+                            result = await worker(batch[0])
+                            results = [(batch[0], result is not None)]
+                    except Exception as e:
+                        logger.error(f"Error in {name} stage: {str(e)}")
+                        results = [(item, False) for item in batch]
 
+                for item, success in results:
+                    if not success:
+                        metrics.error(name)
+                        on_failure(item)
+                    elif out_queue is not None:
+                        await out_queue.put(item)
 
-async def process_files_in_batches(files, album_id, google_creds, onedrive_token):
-    logger.info(f"Processing {len(files)} files in batches of {MAX_BATCH_SIZE}")
-    
-    for i in range(0, len(files), MAX_BATCH_SIZE):
-        batch = files[i:i+MAX_BATCH_SIZE]
-        logger.info(f"Processing batch {i//MAX_BATCH_SIZE + 1} of {-(-len(files)//MAX_BATCH_SIZE)}")
-        
-        # Download batch
-        downloaded_files = []
-        for file in batch:
-            if file['name'].lower().endswith('.png'):
-                file_path = await download_file(file, onedrive_token)
-                if file_path:
-                    downloaded_files.append((file, file_path))
-            elif file['name'].lower().endswith('.xjr'):
-                await delete_file_from_onedrive(file, onedrive_token)
-
-        # Upload batch to Google Photos
-        upload_results = []
-        async for file_path, upload_success in upload_to_google_photos(
-            [f[1] for f in downloaded_files], album_id, google_creds
-        ):
-            upload_results.append((file_path, upload_success))
-
-        # Process results and clean up
-        for (file, file_path), (_, upload_success) in zip(downloaded_files, upload_results):
-            if upload_success:
-                logger.info(f"Successfully uploaded {file['name']} to Google Photos")
-                await delete_file_from_onedrive(file, onedrive_token)
+            if done:
+                await in_queue.put(PIPELINE_DONE)  # Let the other workers of this stage see it too
+                return
+
+    consumers = [asyncio.create_task(consume()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*consumers)
+    finally:
+        await cancel_and_wait(consumers)  # Only still running if one of them raised
+    if out_queue is not None:
+        await out_queue.put(PIPELINE_DONE)
+
+async def process_files_in_batches(session, files, album_id, photos, onedrive_credentials, image_pool,
+                                   journal, hash_index, metrics, stop_event=None):
+    logger.info("Processing OneDrive files through the transfer pipeline")
+    os.makedirs(TRANSFERS_FOLDER, exist_ok=True)
+    results = {'succeeded': 0, 'failed': 0, 'duplicates': 0}
+    memory_budget = ImageMemoryBudget(IMAGE_MEMORY_BUDGET)
+
+    async def download(item):
+        source = await download_file(session, item['file'], onedrive_credentials)
+        if source is None:
+            return None
+        if isinstance(source, str):
+            item['path'] = source  # Spilled to disk, removed again by remove_local_file
+            metrics.count('downloaded_bytes', os.path.getsize(source))
+        else:
+            metrics.count('downloaded_bytes', len(source))
+        item['source'] = source
+        journal.record(item['file'], 'downloaded')
+        return item
+
+    async def transform(item):
+        creation_time = get_onedrive_creation_time(item['file'])
+        item['image_data'] = await process_image(image_pool, item.pop('source'), creation_time, metrics, memory_budget)
+        remove_local_file(item)
+        return item
+
+    async def upload(item):
+        image_data = item.pop('image_data')
+        item['upload_token'] = await photos.upload(image_data)
+        if not item['upload_token']:
+            logger.warning(f"Failed to get upload token for file: {item['file']['name']}")
+            return None
+        metrics.count('uploaded_bytes', len(image_data))
+        logger.debug(f"Successfully uploaded file: {item['file']['name']}")
+        journal.record(item['file'], 'uploaded', upload_token=item['upload_token'])
+        return item
+
+    async def batch_create(items):
+        created = await create_media_items(photos, album_id, items)
+        for item, success in created:
+            if success:
+                keys = hash_index.keys_for(item['file'])
+                journal.record(item['file'], 'created', media_item_id=item.get('media_item_id'),
+                               content_hashes=b''.join(keys) or None)
+                hash_index.add_keys(keys)
             else:
-                logger.warning(f"Failed to upload {file['name']} to Google Photos")
-            
-            # Clean up local file
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Removed local file: {file_path}")
+                # The upload token may be dead (expired or rejected), so don't resume from it
+                # next run, upload the file again
+                journal.record(item['file'], 'downloaded')
+        return created
+
+    async def delete(items):
+        for item in items:
+            # Resumed items were uploaded by an earlier run, which is where they count
+            if not item.get('sidecar') and not item.get('duplicate') and not item.get('resumed'):
+                logger.debug(f"Successfully uploaded {item['file']['name']} to Google Photos")
+                results['succeeded'] += 1
+        deleted = await delete_files_from_onedrive(session, [item['file'] for item in items], onedrive_credentials)
+        for item in items:
+            if deleted.get(item['file']['id']) and not item.get('sidecar'):
+                journal.record(item['file'], 'deleted')
+            remove_local_file(item)
+        # A file that couldn't be deleted is still in Google Photos, it isn't counted as failed
+        return [(item, True) for item in items]
 
-        logger.info(f"Completed processing batch {i//MAX_BATCH_SIZE + 1}")
+    def on_failure(item):
+        logger.warning(f"Failed to upload {item['file']['name']} to Google Photos")
+        results['failed'] += 1
+        remove_local_file(item)
 
+    stage_names = ['download', 'transform', 'upload', 'batch_create', 'delete']
+    queues = {name: asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE) for name in stage_names}
+    stages = [
+        run_pipeline_stage('download', download, queues['download'], queues['transform'],
+                           PIPELINE_CONCURRENCY['download'], on_failure, metrics),
+        run_pipeline_stage('transform', transform, queues['transform'], queues['upload'],
+                           PIPELINE_CONCURRENCY['transform'], on_failure, metrics),
+        run_pipeline_stage('upload', upload, queues['upload'], queues['batch_create'],
+                           PIPELINE_CONCURRENCY['upload'], on_failure, metrics),
+        run_pipeline_stage('batch_create', batch_create, queues['batch_create'], queues['delete'],
+                           PIPELINE_CONCURRENCY['batch_create'], on_failure, metrics, batch_size=MAX_BATCH_SIZE),
+        run_pipeline_stage('delete', delete, queues['delete'], None,
+                           PIPELINE_CONCURRENCY['delete'], on_failure, metrics, batch_size=GRAPH_BATCH_SIZE,
+                           linger=DELETE_BATCH_LINGER),
+    ]
 
-async def sync_photos():
+    async def feed():
+        cancelled = False
+        try:
+            # Finish deletes left over by an interrupted run first, they don't depend on the listing
+            resumed_ids = set()
+            for entry in journal.pending_deletes():
+                logger.debug(f"Resuming OneDrive delete of {entry['name']} from journal")
+                resumed_ids.add(entry['item_id'])
+                file = {'id': entry['item_id'], 'name': entry['name'], 'eTag': entry['etag']}
+                await queues['delete'].put({'file': file, 'resumed': True})
+
+            async for file in files:
+                if stop_event is not None and stop_event.is_set():
+                    # Files already in the pipeline still finish, the rest waits for the next run
+                    logger.info("Shutdown requested, not starting any more files")
+                    break
+                if file['id'] in resumed_ids:
+                    continue
+                step, journal_entry = next_step(file, journal, hash_index)
+                if step == 'duplicate':
+                    logger.debug(f"Skipping {file['name']}, its content was already uploaded")
+                    results['duplicates'] += 1
+                    await queues['delete'].put({'file': file, 'duplicate': True})
+                elif step == 'synced':
+                    logger.debug(f"Skipping {file['name']}, journal says it is already synced")
+                elif step == 'batch_create':
+                    logger.debug(f"Resuming {file['name']} from journal at media item creation")
+                    await queues['batch_create'].put({'file': file, 'upload_token': journal_entry['upload_token']})
+                elif step == 'delete':
+                    await queues['delete'].put({'file': file, 'resumed': True})
+                elif step == 'download':
+                    await queues['download'].put({'file': file})
+                elif step == 'sidecar':
+                    await queues['delete'].put({'file': file, 'sidecar': True})
+        except asyncio.CancelledError:
+            cancelled = True  # The stages are being cancelled too, nothing is left to read the end marker
+            raise
+        finally:
+            # Also end the pipeline when the listing fails part way, or the stages would wait forever
+            await files.aclose()
+            if not cancelled:
+                await queues['download'].put(PIPELINE_DONE)
+
+    sampler = asyncio.create_task(metrics.sample_queues(queues))
+    feeder = asyncio.create_task(feed())
+    stage_tasks = [asyncio.create_task(stage) for stage in stages]
+    try:
+        # Files already in the pipeline still finish when the listing fails, then its error is raised
+        await asyncio.gather(*stage_tasks)
+        await feeder
+    finally:
+        # If a stage raised, stop the others instead of leaving them blocked on their queues
+        sampler.cancel()
+        await cancel_and_wait([feeder, *stage_tasks])
+    for outcome, count in results.items():
+        metrics.count(f"files_{outcome}", count)
+    logger.info(f"Pipeline finished: {results['succeeded']} files transferred, {results['failed']} failed, "
+                f"{results['duplicates']} already uploaded")
+    return results
+
+
+async def run_sync_cycle(session, photos, album_id, onedrive_credentials, image_pool, journal, hash_index,
+                         metrics, stop_event=None):
+    delta_state = {}
+    if USE_DELTA_QUERY:
+        files = iter_delta_from_onedrive(session, ONEDRIVE_FOLDER, onedrive_credentials, delta_state, metrics)
+    else:
+        files = iter_files_from_onedrive(session, ONEDRIVE_FOLDER, onedrive_credentials, metrics)
+
+    results = await process_files_in_batches(session, files, album_id, photos, onedrive_credentials,
+                                             image_pool, journal, hash_index, metrics, stop_event)
+
+    # Only advance the delta token when nothing failed, so failed files are listed again next run.
+    # A run stopped early never reaches the last delta page, so it has no delta link to save.
+    if delta_state.get('delta_link') and not results['failed']:
+        save_delta_link(ONEDRIVE_FOLDER, delta_state['delta_link'])
+    return results
+
+@asynccontextmanager
+async def sync_services(with_album=True):
+    # The setup shared by every command: authenticates, opens the HTTP session and resolves the
+    # album, then logs the connection and rate limiter stats once the command is done. Yields
+    # (session, onedrive_credentials, photos, album_id); without the album (--plan only reads
+    # OneDrive) Google Photos isn't touched and photos and album_id are None.
+    connection_stats = {'handshakes': 0, 'reused': 0}
+    try:
+        onedrive_credentials = await authenticate_onedrive()
+        google_credentials = await authenticate_google_photos() if with_album else None
+
+        async with create_http_session(connection_stats) as session:
+            photos = album_id = None
+            if with_album:
+                photos = PhotosLibraryClient(session, google_credentials)
+                album_id = await get_album_id(photos, ALBUM_TITLE)
+                if not album_id:
+                    raise Exception(f"Failed to find or create Google Photos album '{ALBUM_TITLE}'")
+            yield session, onedrive_credentials, photos, album_id
+    finally:
+        log_connection_stats(connection_stats)
+        log_rate_limiter_stats()
+
+async def sync_photos(metrics_file=None, metrics_summary=False):
     logger.info(f"Starting photo sync at {datetime.now()}")
     
+    metrics = PipelineMetrics()
+    journal = SyncJournal(JOURNAL_FILE)
+    hash_index = ContentHashIndex(HASH_INDEX_FILE)
     try:
-        onedrive_token = await authenticate_onedrive()
-        google_creds = await authenticate_google_photos()
-        
-        service = build('photoslibrary', 'v1', credentials=google_creds, static_discovery=False)
-        album_id = await find_or_create_album(service, ALBUM_TITLE)
-
-        if not album_id:
-            raise Exception(f"Failed to find or create Google Photos album '{ALBUM_TITLE}'")
-        
-        files = await list_files_from_onedrive(ONEDRIVE_FOLDER, onedrive_token)
-        
-        await process_files_in_batches(files, album_id, google_creds, onedrive_token)
+        async with sync_services() as (session, onedrive_credentials, photos, album_id):
+            with ProcessPoolExecutor(max_workers=IMAGE_WORKERS) as image_pool:
+                results = await run_sync_cycle(session, photos, album_id, onedrive_credentials, image_pool,
+                                               journal, hash_index, metrics)
         
         logger.info(f"Sync completed at {datetime.now()}")
+        return results
     
     except Exception as e:
         logger.error(f"Error during sync: {str(e)}", exc_info=True)
+    finally:
+        journal.close()
+        hash_index.close()
+        if metrics_file:
+            metrics.export(metrics_file)
+        if metrics_summary:
+            metrics.log_summary()
+
+PLAN_ACTIONS = {
+    'download': 'transfer',
+    'batch_create': 'create media item',
+    'delete': 'delete from OneDrive',
+    'duplicate': 'delete duplicate',
+    'sidecar': 'delete sidecar',
+    'synced': 'skip, already synced',
+}
+
+async def plan_sync():
+    # --plan: lists OneDrive like a sync run and prints what it would do with every file, without
+    # downloading, uploading or deleting anything, or saving any state (delta link included)
+    logger.info(f"Planning photo sync of '{ONEDRIVE_FOLDER}' to album '{ALBUM_TITLE}'")
+    journal = SyncJournal(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else None
+    hash_index = ContentHashIndex(HASH_INDEX_FILE) if os.path.exists(HASH_INDEX_FILE) else None
+    counts = defaultdict(int)
+    sizes = defaultdict(int)
+    try:
+        async with sync_services(with_album=False) as (session, onedrive_credentials, _, _):
+            if USE_DELTA_QUERY:
+                files = iter_delta_from_onedrive(session, ONEDRIVE_FOLDER, onedrive_credentials, {})
+            else:
+                files = iter_files_from_onedrive(session, ONEDRIVE_FOLDER, onedrive_credentials)
+
+            resumed_ids = set()
+            for entry in (journal.pending_deletes() if journal is not None else []):
+                resumed_ids.add(entry['item_id'])
+                counts['delete'] += 1
+                print(f"{PLAN_ACTIONS['delete']:<22} {entry['name']} (interrupted run)")
+            async for file in files:
+                if file['id'] in resumed_ids:
+                    continue
+                step, _ = next_step(file, journal, hash_index)
+                if step is None:
+                    continue
+                counts[step] += 1
+                sizes[step] += file.get('size', 0)
+                print(f"{PLAN_ACTIONS[step]:<22} {file['name']} ({file.get('size', 0) / 1024 ** 2:.1f} MB)")
+    finally:
+        if journal is not None:
+            journal.close()
+        if hash_index is not None:
+            hash_index.close()
 
-async def main():
+    print(f"Plan: transfer {counts['download']} files ({sizes['download'] / 1024 ** 2:.1f} MB) to album "
+          f"'{ALBUM_TITLE}', create {counts['batch_create']} already uploaded media items, delete "
+          f"{counts['delete']} synced, {counts['duplicate']} duplicate and {counts['sidecar']} sidecar files "
+          f"from OneDrive, skip {counts['synced']} already synced files")
+    return dict(counts)
+
+async def wait_for_next_poll(stop_event, trigger_event, interval):
+    waiters = [asyncio.create_task(stop_event.wait()), asyncio.create_task(trigger_event.wait())]
+    try:
+        await asyncio.wait(waiters, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+    trigger_event.clear()
+
+async def run_daemon(interval, metrics_file=None, metrics_summary=False):
+    # Stays resident between polls so the HTTP pool, image workers, tokens and album id are
+    # reused. SIGUSR1 starts a poll right away; SIGTERM / SIGINT stop taking new files, let
+    # the ones in flight finish and exit.
+    logger.info(f"Starting photo sync daemon, polling OneDrive every {interval}s")
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    trigger_event = asyncio.Event()
+    handled_signals = [signal.SIGTERM, signal.SIGINT]
+    for signum in handled_signals:
+        loop.add_signal_handler(signum, stop_event.set)
+    if hasattr(signal, 'SIGUSR1'):
+        handled_signals.append(signal.SIGUSR1)
+        loop.add_signal_handler(signal.SIGUSR1, trigger_event.set)
+
+    journal = SyncJournal(JOURNAL_FILE)
+    hash_index = ContentHashIndex(HASH_INDEX_FILE)
+    try:
+        # Both credentials refresh themselves ahead of expiry, however long the daemon runs
+        async with sync_services() as (session, onedrive_credentials, photos, album_id):
+            with ProcessPoolExecutor(max_workers=IMAGE_WORKERS) as image_pool:
+                while not stop_event.is_set():
+                    logger.info(f"Starting photo sync at {datetime.now()}")
+                    metrics = PipelineMetrics()
+                    try:
+                        await run_sync_cycle(session, photos, album_id, onedrive_credentials, image_pool,
+                                             journal, hash_index, metrics, stop_event)
+                        logger.info(f"Sync completed at {datetime.now()}")
+                    except Exception as e:
+                        logger.error(f"Error during sync: {str(e)}", exc_info=True)
+                    if metrics_file:
+                        metrics.export(metrics_file)
+                    if metrics_summary:
+                        metrics.log_summary()
+                    await wait_for_next_poll(stop_event, trigger_event, interval)
+        logger.info("Photo sync daemon stopped")
+    finally:
+        for signum in handled_signals:
+            loop.remove_signal_handler(signum)
+        journal.close()
+        hash_index.close()
+
+async def list_album_media_items(photos, album_id):
+    # {media item id: media item} of everything in the album
+    return {media_item['id']: media_item async for media_item in photos.search_album_media_items(album_id)}
+
+def same_creation_time(media_item, file):
+    # Photos takes creationTime from the DateTimeOriginal the syncer stamped from the file's
+    # createdDateTime, which only keeps whole seconds
+    creation_time = media_item.get('mediaMetadata', {}).get('creationTime')
+    if not creation_time:
+        return False
+    creation_time = datetime.fromisoformat(creation_time.replace('Z', '+00:00'))
+    return creation_time.replace(microsecond=0) == get_onedrive_creation_time(file).replace(microsecond=0)
+
+async def rebuild_hash_index():
+    # Backfills the content hash index for media items already in the album. Photos only keeps
+    # the re-encoded JPEG, so the OneDrive hashes can't be recomputed from the album itself.
+    # They come from the journal, which keeps them per created media item, and otherwise from
+    # PNGs still in OneDrive that match an album item by both the name they were uploaded under
+    # and creation time. A file in the index counts as synced and gets deleted, so a name alone
+    # (another source feeding the same album, a new capture reusing a name) is not enough.
+    logger.info(f"Rebuilding content hash index {HASH_INDEX_FILE}")
+    hash_index = ContentHashIndex(HASH_INDEX_FILE)
+    journal = SyncJournal(JOURNAL_FILE)
+    try:
+        async with sync_services() as (session, onedrive_credentials, photos, album_id):
+            album_items = await list_album_media_items(photos, album_id)
+            logger.info(f"Found {len(album_items)} media items in album '{ALBUM_TITLE}'")
+
+            added = 0
+            unmatched = dict(album_items)
+            for entry in journal.created_media_items():
+                if unmatched.pop(entry['media_item_id'], None) is not None:
+                    hashes = entry['content_hashes']
+                    added += hash_index.add_keys(hashes[i:i + ContentHashIndex.RECORD_SIZE]
+                                                 for i in range(0, len(hashes), ContentHashIndex.RECORD_SIZE))
+            unmatched_names = defaultdict(list)
+            for media_item in unmatched.values():
+                unmatched_names[media_item['filename']].append(media_item)
+            async for file in iter_files_from_onedrive(session, ONEDRIVE_FOLDER, onedrive_credentials):
+                if not file['name'].lower().endswith('.png'):
+                    continue  # Only screenshots are uploaded, as in next_step
+                for media_item in unmatched_names.get(os.path.splitext(file['name'])[0], []):
+                    if media_item['id'] not in unmatched:
+                        continue
+                    if same_creation_time(media_item, file):
+                        added += hash_index.add(file)
+                        del unmatched[media_item['id']]
+                        break
+                    logger.info(f"{file['name']} has the name of album item {media_item['id']} but not its "
+                                f"creation time, not indexing it")
+        logger.info(f"Added {added} content hashes, index now holds {len(hash_index.hashes)}")
+        if unmatched:
+            logger.warning(f"{len(unmatched)} of {len(album_items)} media items in the album match neither a "
+                           f"journal entry nor a file still in OneDrive, their content is not in the index")
+    finally:
+        journal.close()
+        hash_index.close()
+
+# Source keys a --config file may set, and the module setting each one overrides
+SOURCE_SETTINGS = {
+    'onedrive_folder': 'ONEDRIVE_FOLDER',
+    'album': 'ALBUM_TITLE',
+    'onedrive_token_file': 'TOKEN_FILE_ONEDRIVE',
+    'google_token_file': 'TOKEN_PICKLE_GOOGLE',
+    'use_delta_query': 'USE_DELTA_QUERY',
+    'image_workers': 'IMAGE_WORKERS',
+    'image_memory_budget': 'IMAGE_MEMORY_BUDGET',
+    'concurrency': 'PIPELINE_CONCURRENCY',
+    'pool_limit': 'HTTP_POOL_LIMIT',
+    'pool_limit_per_host': 'HTTP_POOL_LIMIT_PER_HOST',
+    'rate_limit': 'RATE_LIMIT_INITIAL',
+    'rate_limit_max': 'RATE_LIMIT_MAX',
+}
+# Per-source state, moved under the source's state_dir
+SOURCE_STATE_FILES = ['JOURNAL_FILE', 'HASH_INDEX_FILE', 'DELTA_TOKEN_FILE', 'ALBUM_CACHE_FILE', 'TRANSFERS_FOLDER']
+DEFAULT_SETTINGS = {name: globals()[name] for name in [*SOURCE_SETTINGS.values(), *SOURCE_STATE_FILES]}
+
+def load_sync_config(path):
+    # {"workers": 2, "sources": [{"name": "console-1", "onedrive_folder": "...", "album": "...", ...}]}
+    with open(path, 'r') as f:
+        config = json.load(f)
+    sources = config.get('sources') or []
+    if not sources:
+        raise ValueError(f"{path} defines no sources")
+    names = set()
+    for source in sources:
+        missing = [key for key in ('name', 'onedrive_folder', 'album') if key not in source]
+        if missing:
+            raise ValueError(f"Source {source} in {path} is missing {', '.join(missing)}")
+        unknown = set(source) - set(SOURCE_SETTINGS) - {'name', 'state_dir'}
+        if unknown:
+            raise ValueError(f"Unknown settings for source '{source['name']}' in {path}: {', '.join(sorted(unknown))}")
+        if source['name'] in names:
+            raise ValueError(f"Duplicate source name '{source['name']}' in {path}")
+        names.add(source['name'])
+    return config
+
+def apply_source_settings(source, workers):
+    # Starts from the defaults every time, a worker process may have synced another source before
+    settings = {name: dict(value) if isinstance(value, dict) else value for name, value in DEFAULT_SETTINGS.items()}
+    # The worker processes share the CPUs, by default each gets an equal slice for image work
+    settings['IMAGE_WORKERS'] = max(1, (os.cpu_count() or 1) // workers)
+    settings['IMAGE_MEMORY_BUDGET'] = DEFAULT_SETTINGS['IMAGE_MEMORY_BUDGET'] // workers
+    for key, name in SOURCE_SETTINGS.items():
+        if key == 'concurrency':
+            settings[name].update(source.get(key, {}))
+        elif key in source:
+            settings[name] = source[key]
+    if 'transform' not in source.get('concurrency', {}):
+        settings['PIPELINE_CONCURRENCY']['transform'] = settings['IMAGE_WORKERS']
+
+    state_dir = source.get('state_dir', os.path.join(STATE_ROOT, source['name']))
+    os.makedirs(state_dir, exist_ok=True)
+    for name in SOURCE_STATE_FILES:
+        settings[name] = os.path.join(state_dir, DEFAULT_SETTINGS[name])
+    globals().update(settings)
+    rate_limiters.clear()
+
+def run_source(source, workers, metrics_file, metrics_summary, log_level):
+    # Runs in a --config worker process: one source with its own HTTP pool, rate limiters and image workers
+    apply_source_settings(source, workers)
+    logger.setLevel(log_level)
+    formatter = logging.Formatter(f"%(asctime)s - {source['name']} - %(levelname)s - %(message)s",
+                                  datefmt='%Y-%m-%d %H:%M:%S')
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(formatter)
+    if metrics_file:
+        root, ext = os.path.splitext(metrics_file)
+        metrics_file = f"{root}.{source['name']}{ext}"
+    return asyncio.run(sync_photos(metrics_file, metrics_summary))
+
+async def count_pending_files(session, source):
+    # One request per source: the folder's child count (sidecars included) is enough to balance on
+    onedrive_credentials = await authenticate_onedrive(source.get('onedrive_token_file'))
+    folder_url = f"{ONEDRIVE_API_ENDPOINT}/drive/root:/{source['onedrive_folder']}"
+    headers = {"Accept": "application/json"}
+    async with http_request(session, 'GET', folder_url, headers=headers, credentials=onedrive_credentials) as response:
+        if response.status != 200:
+            logger.warning(f"Couldn't count files of source '{source['name']}': {response.status}")
+            return 0
+        return (await response.json()).get('folder', {}).get('childCount', 0)
+
+async def sync_sources(config_path, metrics_file=None, metrics_summary=False):
+    config = load_sync_config(config_path)
+    sources = config['sources']
+    workers = max(1, min(config.get('workers', SYNC_WORKERS), len(sources)))
+
+    connection_stats = {'handshakes': 0, 'reused': 0}
+    async with create_http_session(connection_stats) as session:
+        pending = {source['name']: await count_pending_files(session, source) for source in sources}
+    # Longest first: the pool hands each next-biggest source to the first free worker, so the
+    # small ones fill in around the big ones instead of one worker ending up with all the work
+    sources = sorted(sources, key=lambda source: pending[source['name']], reverse=True)
+    logger.info(f"Syncing {len(sources)} sources on {workers} worker processes: "
+                + ', '.join(f"{source['name']} ({pending[source['name']]} files)" for source in sources))
+
+    loop = asyncio.get_running_loop()
+    # Spawned, not forked: a worker must not inherit this process's event loop and sockets
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(pool, run_source, source, workers, metrics_file, metrics_summary, logger.level)
+            for source in sources
+        ), return_exceptions=True)
+
+    for source, outcome in zip(sources, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"Source '{source['name']}' failed: {outcome}")
+        elif outcome is None:
+            logger.error(f"Source '{source['name']}' failed, see its log above")
+        else:
+            logger.info(f"Source '{source['name']}': {outcome['succeeded']} files transferred, "
+                        f"{outcome['failed']} failed, {outcome['duplicates']} already uploaded")
+
+async def main(args):
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
     logger.info("Script started")
-    await sync_photos()
+    if args.rebuild_hash_index:
+        await rebuild_hash_index()
+    elif args.plan:
+        await plan_sync()
+    elif args.config:
+        await sync_sources(args.config, args.metrics_file or METRICS_FILE, args.metrics_summary or METRICS_SUMMARY)
+    elif args.daemon:
+        await run_daemon(args.interval, args.metrics_file or METRICS_FILE, args.metrics_summary or METRICS_SUMMARY)
+    else:
+        await sync_photos(args.metrics_file or METRICS_FILE, args.metrics_summary or METRICS_SUMMARY)
     logger.info("Script finished")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description='Move photos from a OneDrive folder into a Google Photos album')
+    parser.add_argument('--rebuild-hash-index', action='store_true',
+                        help='Backfill the content hash index from files already in the target album')
+    parser.add_argument('--plan', action='store_true',
+                        help='Print what a sync would transfer, delete and skip without doing any of it')
+    parser.add_argument('--config',
+                        help='JSON file mapping OneDrive folders / accounts to albums, synced in parallel worker processes')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Stay running and poll OneDrive every --interval seconds (SIGUSR1: poll now, SIGTERM: drain and exit)')
+    parser.add_argument('--interval', type=float, default=DAEMON_INTERVAL, help='Seconds between polls in --daemon mode')
+    parser.add_argument('--metrics-file',
+                        help='Write run metrics to this file at the end of the sync (*.prom: Prometheus text format, else JSON)')
+    parser.add_argument('--metrics-summary', action='store_true',
+                        help='Log a per-stage latency and throughput table at the end of the sync')
+    parser.add_argument('--verbose', action='store_true', help='Log every file as it moves through the pipeline')
+    args = parser.parse_args()
+    if args.plan and (args.config or args.daemon):
+        parser.error('--plan plans a single sync of ONEDRIVE_FOLDER, it cannot be combined with --config or --daemon')
+    if args.config and (args.daemon or args.rebuild_hash_index):
+        parser.error('--config runs one pass over its sources, it cannot be combined with --daemon or --rebuild-hash-index')
+    asyncio.run(main(args))